@@ -0,0 +1,88 @@
+import asyncio
+import json
+import logging
+
+from database import record_test_answers
+import leaderboards
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Javoblar test davomida test sessiyasining Redis kalitida yig'iladi (test_sessions.record_answer):
+# i-javob test rejasidagi i-savolga tegishli. Bazaga javoblar test oxirida bitta so'rov bilan yoziladi.
+# Bazaga yozib bo'lmasa, javoblar shu Redis ro'yxatiga tushadi va fonda qayta urinib ko'riladi.
+# Muvaffaqiyatli yozilgan javoblar haftalik reyting va kunlik seriyaga ham qo'shiladi.
+# Yozuv ro'yxat oxiriga urinishlar soni bilan qaytariladi, shuning uchun yozib bo'lmaydigan bitta yozuv
+# qolganlarini to'sib qo'ymaydi; MAX_FLUSH_ATTEMPTS marta muvaffaqiyatsiz bo'lgan yozuv DEAD_FLUSHES_KEY ga
+# ko'chiriladi (qo'lda tekshirish va qayta yozish uchun).
+PENDING_FLUSHES_KEY = "pending_answer_flushes"
+DEAD_FLUSHES_KEY = "pending_answer_flushes:dead"
+MAX_FLUSH_ATTEMPTS = 10
+# Kutilayotgan yozuvlarni qayta urinish oralig'i (soniya)
+RETRY_INTERVAL = 30
+
+
+def decode_answers(answers: int, answered_count: int) -> list[bool]:
+    """
+    Bitmaskadan birinchi answered_count ta javob natijasini qaytaradi (javoblar FSM holatida bitmaska
+    ko'rinishida saqlangan oldingi versiya yozuvlari uchun).
+    """
+    return [bool(answers >> i & 1) for i in range(answered_count)]
+
+
+async def flush_answers(redis, user_id: int, test_plan: list, outcomes: list[bool]):
+    """
+    Buferdagi javoblarni (outcomes[i] - rejadagi i-savol natijasi) bazaga yozadi.
+    Xato bo'lsa, javoblar yo'qolmasligi uchun Redis'dagi kutish ro'yxatiga qo'yiladi.
+    """
+    if not outcomes:
+        return
+    word_ids = [question[0] for question in test_plan[:len(outcomes)]]
+    outcomes = outcomes[:len(word_ids)]
+    try:
+        await record_test_answers(user_id, word_ids, outcomes)
+    except Exception as e:
+        logger.error(f"Foydalanuvchi {user_id} javoblarini bazaga yozishda xato, keyinroq qayta uriniladi: {e}")
+        payload = json.dumps({'user_id': user_id, 'word_ids': word_ids, 'outcomes': outcomes})
+        await redis.rpush(PENDING_FLUSHES_KEY, payload)
+        return
+    await leaderboards.record_answers(redis, user_id, sum(outcomes), len(outcomes))
+
+
+async def retry_pending_flushes(redis):
+    """
+    Oldin bazaga yozilmay qolgan javoblarni qayta yozishga harakat qiladi.
+    Bitta aylanmada ro'yxatdagi har bir yozuv ko'pi bilan bir marta olinadi.
+    """
+    for _ in range(await redis.llen(PENDING_FLUSHES_KEY)):
+        payload = await redis.lpop(PENDING_FLUSHES_KEY)
+        if payload is None:
+            return
+        item = json.loads(payload)
+        outcomes = item.get('outcomes') or decode_answers(item['answers'], len(item['word_ids']))
+        try:
+            await record_test_answers(item['user_id'], item['word_ids'], outcomes)
+        except Exception as e:
+            item['attempts'] = item.get('attempts', 0) + 1
+            if item['attempts'] >= MAX_FLUSH_ATTEMPTS:
+                await redis.rpush(DEAD_FLUSHES_KEY, json.dumps(item))
+                logger.error(f"Foydalanuvchi {item['user_id']} javoblari {item['attempts']} marta yozilmadi, "
+                             f"{DEAD_FLUSHES_KEY} ga ko'chirildi: {e}")
+                continue
+            # Yozuv ro'yxat oxiriga qaytariladi; baza ishlamayotgan bo'lishi mumkin - keyingi aylanmagacha kutamiz
+            await redis.rpush(PENDING_FLUSHES_KEY, json.dumps(item))
+            logger.error(f"Kutilayotgan javoblarni yozishda xato ({item['attempts']}-urinish): {e}")
+            return
+        await leaderboards.record_answers(redis, item['user_id'], sum(outcomes), len(outcomes))
+
+
+async def run_pending_flush_worker(redis):
+    """
+    Kutilayotgan javoblarni vaqti-vaqti bilan bazaga yozib turadigan fon vazifasi.
+    """
+    while True:
+        try:
+            await retry_pending_flushes(redis)
+        except Exception as e:
+            logger.error(f"Javoblar buferini qayta yozish vazifasida xato: {e}")
+        await asyncio.sleep(RETRY_INTERVAL)
@@ -0,0 +1,103 @@
+"""
+user_stats jadvalini (har bir foydalanuvchi progressining yig'indisi) mavjud ma'lumotlardan qurish.
+
+Bot user_stats ni har bir javob va test natijasida o'zi yangilab boradi; bu buyruq jadval paydo
+bo'lishidan oldingi foydalanuvchilar uchun (yoki yig'indilar buzilganda qayta hisoblash uchun) ishlatiladi.
+Foydalanuvchilar ID oralig'i bo'yicha partiyalab, har bir partiya alohida tranzaksiyada qayta ishlanadi,
+shuning uchun ishlayotgan botni to'xtatish shart emas: partiya qatorlari qulflangan paytda kelgan
+yangilanishlar qulf bo'shagach qayta hisoblangan qiymat ustiga qo'shiladi.
+
+O'rganilgan so'zlar va urinishlar user_words dan qayta hisoblanadi, oxirgi faollik - so'z olish, test va
+javob sanalarining eng kechi. O'tilgan/o'tilmagan testlar soni tarixda saqlanmagan, shuning uchun ular
+o'zgartirilmaydi (yangi qatorlar uchun 0). Buyruq bot yangi versiyada ishga tushgandan (migratsiya 8
+bajarilgandan) keyin ishga tushiriladi.
+
+Ishlatish:
+    python backfill_user_stats.py
+    python backfill_user_stats.py --batch-size 5000
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+import asyncpg
+
+from config import DB_URL
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Bitta tranzaksiyada qayta ishlanadigan foydalanuvchilar ID oralig'i
+BATCH_SIZE = 1000
+
+
+async def _backfill_batch(conn, first_id: int, last_id: int) -> int:
+    async with conn.transaction():
+        # Qatorlar avval yaratiladi va qulflanadi: parallel yangilanishlar qayta hisoblash tugashini kutadi
+        await conn.execute('''
+            INSERT INTO user_stats (user_id)
+            SELECT id FROM users WHERE id BETWEEN $1 AND $2
+            ON CONFLICT (user_id) DO NOTHING;
+        ''', first_id, last_id)
+        await conn.execute('''
+            SELECT 1 FROM user_stats WHERE user_id BETWEEN $1 AND $2 FOR UPDATE;
+        ''', first_id, last_id)
+        status = await conn.execute('''
+            UPDATE user_stats s SET
+                learned_count = COALESCE(w.learned_count, 0),
+                total_attempts = COALESCE(w.total_attempts, 0),
+                correct_attempts = COALESCE(w.correct_attempts, 0),
+                last_activity_at = GREATEST(s.last_activity_at, u.last_word_fetch_date, u.last_test_date, w.last_attempt_date)
+            FROM users u
+            LEFT JOIN (
+                SELECT user_id,
+                       COUNT(*) FILTER (WHERE is_learned) AS learned_count,
+                       SUM(total_attempts) AS total_attempts,
+                       SUM(correct_attempts) AS correct_attempts,
+                       MAX(last_attempt_date) AS last_attempt_date
+                FROM user_words
+                WHERE user_id BETWEEN $1 AND $2
+                GROUP BY user_id
+            ) w ON w.user_id = u.id
+            WHERE s.user_id = u.id AND u.id BETWEEN $1 AND $2;
+        ''', first_id, last_id)
+        return int(status.split()[-1])
+
+
+async def backfill_user_stats(batch_size: int = BATCH_SIZE, conn=None) -> dict:
+    """
+    Barcha foydalanuvchilar uchun user_stats qatorlarini quradi (yoki qayta hisoblaydi) va statistikani qaytaradi.
+    """
+    own_connection = conn is None
+    if own_connection:
+        conn = await asyncpg.connect(DB_URL)
+    started_at = time.monotonic()
+    stats = {'users': 0}
+    try:
+        min_id, max_id = await conn.fetchrow("SELECT MIN(id), MAX(id) FROM users;")
+        if min_id is not None:
+            for first_id in range(min_id, max_id + 1, batch_size):
+                last_id = min(max_id, first_id + batch_size - 1)
+                stats['users'] += await _backfill_batch(conn, first_id, last_id)
+                logger.info(f"user_stats: {last_id - min_id + 1}/{max_id - min_id + 1} ID qayta ishlandi")
+    finally:
+        if own_connection:
+            await conn.close()
+
+    stats['seconds'] = round(time.monotonic() - started_at, 3)
+    logger.info(f"user_stats to'ldirildi: {stats['users']} ta foydalanuvchi {stats['seconds']} soniyada.")
+    return stats
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="user_stats jadvalini mavjud ma'lumotlardan qurish")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Bitta tranzaksiyadagi foydalanuvchilar ID oralig'i")
+    args = parser.parse_args()
+
+    print(json.dumps(await backfill_user_stats(args.batch_size)))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
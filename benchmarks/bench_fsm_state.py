@@ -0,0 +1,56 @@
+"""
+Test paytidagi FSM holati hajmi va (de)serializatsiya vaqtini o'lchaydi.
+
+aiogram RedisStorage holatni har bir get_data/update_data da json orqali
+serializatsiya qiladi. Bu skript uchta ko'rinishni solishtiradi:
+  - test_words: 50 ta so'z qatorining to'liq ro'yxati (dastlabki holat)
+  - test_plan: FSM ichidagi savollar rejasi
+  - compact: faqat sessiya ID'si, savol indeksi, ball va javoblar bitmaskasi
+
+Ishlatish:
+    python benchmarks/bench_fsm_state.py
+"""
+import json
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import WORDS_PER_DAY, TEST_OPTIONS_COUNT
+import test_sessions
+
+
+def make_states() -> dict:
+    word_ids = random.sample(range(1, 100_000), WORDS_PER_DAY)
+    test_words = [
+        {'id': word_id, 'english_word': f"word{word_id}", 'uzbek_word': f"so'z {word_id}",
+         'audio_url': "CQACAgIAAxkDAAIBZ2Z" + "x" * 40, 'correct_attempts': 3, 'total_attempts': 4}
+        for word_id in word_ids
+    ]
+    test_plan = [[word_id, random.randint(0, 1)] + random.sample(range(1, 100_000), TEST_OPTIONS_COUNT) for word_id in word_ids]
+    counters = {'db_user_id': 12345, 'current_question_index': 37, 'correct_answers_count': 35}
+    return {
+        'test_words': {**counters, 'test_words': test_words},
+        'test_plan': {**counters, 'test_plan': test_plan, 'test_answers': '1' * 37},
+        'compact': {**counters, 'test_session': 'a1b2c3d4', 'test_answers': (1 << 37) - 5},
+        '_plan_bytes': test_sessions.pack_plan(test_plan),
+    }
+
+
+def main():
+    states = make_states()
+    print(f"{'korinish':>12} {'bayt':>8} {'dumps_mks':>10} {'loads_mks':>10}")
+    for name in ('test_words', 'test_plan', 'compact'):
+        state = states[name]
+        payload = json.dumps(state)
+        number = 5000
+        dumps = timeit.timeit(lambda: json.dumps(state), number=number) / number * 1e6
+        loads = timeit.timeit(lambda: json.loads(payload), number=number) / number * 1e6
+        print(f"{name:>12} {len(payload):>8} {dumps:>10.1f} {loads:>10.1f}")
+    print(f"Test rejasi alohida kalitda (bir marta yoziladi): {len(states['_plan_bytes'])} bayt")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Chiquvchi xabarlar rejalashtiruvchisini lokal soxta Bot API serveriga qarshi sinaydi.
+
+Bir nechta chatga bir vaqtda interaktiv va ommaviy xabarlar yuboriladi. Natijada
+o'tkazuvchanlik (xabar/s), serverdan kelgan 429 javoblari, yo'qolgan xabarlar va
+ustuvorliklar bo'yicha o'rtacha yetkazish vaqti chiqariladi. --no-scheduler bilan
+rejalashtiruvchisiz (to'g'ridan-to'g'ri yuborish) natija bilan solishtirish mumkin.
+
+Ishlatish:
+    python benchmarks/bench_send_scheduler.py --chats 200 --messages 600
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.exceptions import TelegramRetryAfter
+
+from fake_bot_api import start_fake_bot_api
+from send_scheduler import SendScheduler, bulk_priority
+
+
+async def _send(bot: Bot, chat_id: int, bulk: bool, latencies: dict, errors: list):
+    started_at = time.monotonic()
+    try:
+        if bulk:
+            with bulk_priority():
+                await bot.send_message(chat_id, "Eslatma: test vaqti keldi!")
+        else:
+            await bot.send_message(chat_id, "Savol")
+    except TelegramRetryAfter as e:
+        errors.append(str(e))
+        return
+    latencies['bulk' if bulk else 'interactive'].append(time.monotonic() - started_at)
+
+
+async def run(args) -> dict:
+    api, runner = await start_fake_bot_api(port=args.port)
+    bot = Bot(token="123:fake", session=AiohttpSession(api=TelegramAPIServer.from_base(f"http://127.0.0.1:{args.port}")))
+    scheduler = None
+    if not args.no_scheduler:
+        scheduler = SendScheduler()
+        bot.session.middleware(scheduler)
+
+    latencies = {'interactive': [], 'bulk': []}
+    errors = []
+    chat_ids = [1000 + i for i in range(args.chats)]
+    started_at = time.monotonic()
+    try:
+        tasks = []
+        for i in range(args.messages):
+            bulk = random.random() < args.bulk_share
+            tasks.append(_send(bot, random.choice(chat_ids), bulk, latencies, errors))
+        await asyncio.gather(*tasks)
+    finally:
+        elapsed = time.monotonic() - started_at
+        await bot.session.close()
+        await runner.cleanup()
+
+    delivered = len(latencies['interactive']) + len(latencies['bulk'])
+    result = {
+        'scheduler': scheduler is not None,
+        'messages': args.messages,
+        'delivered': delivered,
+        'dropped': len(errors),
+        'seconds': round(elapsed, 3),
+        'messages_per_second': round(delivered / elapsed, 1),
+        'server_429': api.stats['too_many_requests'],
+    }
+    for kind, values in latencies.items():
+        if values:
+            result[f'{kind}_avg_latency'] = round(sum(values) / len(values), 3)
+    if scheduler is not None:
+        result['scheduler_metrics'] = scheduler.get_metrics()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chiquvchi xabarlar rejalashtiruvchisi benchmarki")
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=600)
+    parser.add_argument("--bulk-share", type=float, default=0.7, help="Ommaviy xabarlar ulushi")
+    parser.add_argument("--port", type=int, default=8091)
+    parser.add_argument("--no-scheduler", action="store_true", help="Rejalashtiruvchisiz yuborish")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
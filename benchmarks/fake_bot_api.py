@@ -0,0 +1,179 @@
+"""
+Lokal soxta Telegram Bot API serveri (yuklama va limit sinovlari uchun).
+
+Server /bot<token>/<method> so'rovlarini qabul qiladi va haqiqiy API'ga o'xshash javob qaytaradi.
+Telegram limitlari ham taqlid qilinadi: umumiy va har bir chat uchun token bucket,
+limit oshsa 429 va parameters.retry_after qaytariladi. Har bir metod bo'yicha statistika yig'iladi.
+Chatlarga yuborilgan xabarlar (matni va tugmalari bilan) outbox'da saqlanadi, yuklama testi
+ularni wait_for_message() orqali kutadi.
+
+Ishlatish:
+    python benchmarks/fake_bot_api.py --port 8081
+    TELEGRAM_API_URL=http://127.0.0.1:8081 python main.py
+"""
+import argparse
+import asyncio
+from collections import defaultdict
+import itertools
+import json
+import time
+
+from aiohttp import web
+
+GLOBAL_RATE = 30
+GLOBAL_BURST = 5
+CHAT_RATE = 1
+CHAT_BURST = 5
+
+
+class _Bucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+
+    def take(self) -> float:
+        """
+        Token olishga urinadi: muvaffaqiyatli bo'lsa 0, aks holda token paydo bo'lishigacha soniyalar.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class FakeBotAPI:
+    def __init__(self, global_rate: float = GLOBAL_RATE, chat_rate: float = CHAT_RATE, latency: float = 0.0):
+        self.global_bucket = _Bucket(global_rate, GLOBAL_BURST)
+        self.chat_rate = chat_rate
+        self.latency = latency
+        self.chat_buckets = {}
+        self.message_ids = itertools.count(1)
+        self.stats = {'requests': 0, 'ok': 0, 'too_many_requests': 0, 'methods': {}}
+        self.started_at = time.monotonic()
+        self.record_messages = False
+        self.outbox = defaultdict(list) # chat_id -> [{'method', 'message_id', 'text', 'reply_markup'}]
+        self._outbox_events = defaultdict(asyncio.Event)
+
+    def _record_message(self, method: str, chat_id: int, message: dict, params):
+        reply_markup = params.get('reply_markup')
+        self.outbox[chat_id].append({
+            'method': method,
+            'message_id': message['message_id'],
+            'text': message.get('text', ''),
+            'reply_markup': json.loads(reply_markup) if reply_markup else None,
+        })
+        event = self._outbox_events.pop(chat_id, None)
+        if event is not None:
+            event.set()
+
+    async def wait_for_message(self, chat_id: int, after: int, predicate=None, timeout: float = 30.0):
+        """
+        Chatga after-indeksdan keyin yuborilgan va predicate ga mos birinchi xabarni kutadi.
+        (indeks, xabar) qaytaradi, vaqt tugasa asyncio.TimeoutError.
+        """
+        deadline = time.monotonic() + timeout
+        index = after
+        while True:
+            messages = self.outbox[chat_id]
+            while index < len(messages):
+                message = messages[index]
+                index += 1
+                if predicate is None or predicate(message):
+                    return index, message
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            await asyncio.wait_for(self._outbox_events[chat_id].wait(), timeout=remaining)
+
+    def _result(self, method: str, params):
+        now = int(time.time())
+        if method == 'getme':
+            return {'id': 1, 'is_bot': True, 'first_name': 'FakeBot', 'username': 'fake_bot'}
+        if method.startswith(('send', 'edit', 'copy', 'forward')):
+            chat_id = int(params.get('chat_id', 0))
+            message = {
+                'message_id': int(params.get('message_id') or next(self.message_ids)),
+                'date': now,
+                'chat': {'id': chat_id, 'type': 'private'},
+                'text': params.get('text', ''),
+            }
+            if method == 'sendaudio':
+                message_id = message['message_id']
+                message['audio'] = {'file_id': f"fake-audio-{message_id}", 'file_unique_id': f"u{message_id}", 'duration': 1}
+            return message
+        return True
+
+    async def handle(self, request: web.Request):
+        method = request.match_info['method'].lower()
+        params = await request.post()
+        self.stats['requests'] += 1
+        self.stats['methods'][method] = self.stats['methods'].get(method, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        chat_id = params.get('chat_id')
+        if chat_id is not None:
+            retry_after = self.global_bucket.take()
+            if not retry_after:
+                bucket = self.chat_buckets.get(chat_id)
+                if bucket is None:
+                    bucket = self.chat_buckets[chat_id] = _Bucket(self.chat_rate, CHAT_BURST)
+                retry_after = bucket.take()
+            if retry_after:
+                self.stats['too_many_requests'] += 1
+                return web.json_response({
+                    'ok': False,
+                    'error_code': 429,
+                    'description': f"Too Many Requests: retry after {max(1, round(retry_after))}",
+                    'parameters': {'retry_after': max(1, round(retry_after))},
+                })
+
+        self.stats['ok'] += 1
+        result = self._result(method, params)
+        if self.record_messages and isinstance(result, dict) and chat_id is not None:
+            self._record_message(method, int(chat_id), result, params)
+        return web.json_response({'ok': True, 'result': result})
+
+    async def handle_stats(self, request: web.Request):
+        elapsed = time.monotonic() - self.started_at
+        return web.json_response({**self.stats, 'seconds': round(elapsed, 3)})
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self.handle)
+        app.router.add_get('/stats', self.handle_stats)
+        return app
+
+
+async def start_fake_bot_api(host: str = '127.0.0.1', port: int = 8081, **kwargs):
+    """
+    Serverni fon rejimida ishga tushiradi va (FakeBotAPI, AppRunner) qaytaradi.
+    """
+    api = FakeBotAPI(**kwargs)
+    runner = web.AppRunner(api.make_app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return api, runner
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Lokal soxta Telegram Bot API serveri")
+    parser.add_argument("--host", default='127.0.0.1')
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--global-rate", type=float, default=GLOBAL_RATE, help="Umumiy limit (xabar/s)")
+    parser.add_argument("--chat-rate", type=float, default=CHAT_RATE, help="Har bir chat uchun limit (xabar/s)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Har bir so'rovga qo'shiladigan kechikish (s)")
+    args = parser.parse_args()
+
+    await start_fake_bot_api(args.host, args.port, global_rate=args.global_rate, chat_rate=args.chat_rate, latency=args.latency)
+    print(f"Soxta Bot API: http://{args.host}:{args.port} (statistika: /stats)")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
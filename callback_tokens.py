@@ -0,0 +1,55 @@
+import base64
+import hashlib
+import hmac
+import struct
+
+from config import BOT_TOKEN, CALLBACK_SECRET
+
+# Test javobi tugmalari uchun ixcham, imzolangan callback_data.
+# Tarkibi (ikkilik): versiya (1 bayt), sessiya ID (8 bayt), savol indeksi (2 bayt), variant indeksi (1 bayt)
+# va shu ma'lumotlar hamda chat ID bo'yicha HMAC-SHA256 ning birinchi 8 bayti.
+# Natija base64url ko'rinishida 'q' prefiksi bilan yoziladi (28 belgi, Telegramning 64 baytlik chegarasidan ancha kam).
+# 1-versiya (4 baytlik sessiya ID) yangilanishdan oldin boshlangan testlar tugashi uchun hali qabul qilinadi.
+TOKEN_PREFIX = "q"
+TOKEN_VERSION = 2
+_PAYLOADS = {1: struct.Struct(">B4sHB"), 2: struct.Struct(">B8sHB")}
+_MAC_SIZE = 8
+
+_secret = (CALLBACK_SECRET or hashlib.sha256(f"callback:{BOT_TOKEN}".encode()).hexdigest()).encode()
+
+
+def _mac(chat_id: int, payload: bytes) -> bytes:
+    return hmac.new(_secret, struct.pack(">q", chat_id) + payload, hashlib.sha256).digest()[:_MAC_SIZE]
+
+
+def encode_answer_token(chat_id: int, session_id: str, question_index: int, option_index: int) -> str:
+    """
+    Javob tugmasi uchun imzolangan callback_data yaratadi.
+    """
+    session_bytes = bytes.fromhex(session_id)
+    version = TOKEN_VERSION if len(session_bytes) == _PAYLOADS[TOKEN_VERSION].size - 4 else 1
+    payload = _PAYLOADS[version].pack(version, session_bytes, question_index, option_index)
+    token = base64.urlsafe_b64encode(payload + _mac(chat_id, payload)).rstrip(b'=').decode()
+    return TOKEN_PREFIX + token
+
+
+def decode_answer_token(chat_id: int, data: str):
+    """
+    callback_data ni tekshiradi va (session_id, question_index, option_index) qaytaradi.
+    Format noto'g'ri, versiya eskirgan yoki imzo mos kelmasa None qaytaradi.
+    """
+    if not data or not data.startswith(TOKEN_PREFIX):
+        return None
+    token = data[len(TOKEN_PREFIX):]
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+    except ValueError:
+        return None
+    payload_struct = _PAYLOADS.get(raw[0]) if raw else None
+    if payload_struct is None or len(raw) != payload_struct.size + _MAC_SIZE:
+        return None
+    payload, mac = raw[:payload_struct.size], raw[payload_struct.size:]
+    if not hmac.compare_digest(mac, _mac(chat_id, payload)):
+        return None
+    _, session_id, question_index, option_index = payload_struct.unpack(payload)
+    return session_id.hex(), question_index, option_index
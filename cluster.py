@@ -0,0 +1,60 @@
+import asyncio
+import logging
+
+from redis.exceptions import LockError
+
+from config import UPDATE_DEDUP_TTL
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Bir nechta jarayon (yoki server) bitta Redis bilan ishlaganda kerak bo'ladigan yordamchilar.
+# Telegram javob kechiksa update'ni qayta yuboradi va u boshqa jarayonga tushishi mumkin,
+# shuning uchun har bir update_id Redis'da UPDATE_DEDUP_TTL soniya eslab qolinadi.
+PROCESSED_UPDATE_KEY = "processed_update:{}"
+LEADER_LOCK_KEY = "leader:{}"
+LEADER_DONE_KEY = "leader:{}:done"
+# Yetakchi jarayon qulfni ushlab turadigan eng uzoq vaqt (jarayon qulab tushsa, boshqasi o'rnini egallaydi)
+LEADER_LOCK_TTL = 300
+# Yetakchi ishni tugatgani haqidagi belgi kutib turgan jarayonlar ko'rishi uchun qancha saqlanadi
+LEADER_DONE_TTL = 60
+LEADER_POLL_INTERVAL = 0.5
+
+
+async def is_duplicate_update(redis, update_id: int) -> bool:
+    """
+    Update avval (shu yoki boshqa jarayonda) qabul qilingan bo'lsa True qaytaradi.
+    """
+    is_new = await redis.set(PROCESSED_UPDATE_KEY.format(update_id), 1, nx=True, ex=UPDATE_DEDUP_TTL)
+    return not is_new
+
+
+async def forget_update(redis, update_id: int):
+    """
+    Qabul qilinmay qolgan update'ni unutadi, shunda Telegram qayta yuborganda u qayta ishlanadi.
+    """
+    await redis.delete(PROCESSED_UPDATE_KEY.format(update_id))
+
+async def run_as_leader(redis, name: str, func) -> bool:
+    """
+    func() ni barcha jarayonlar ichidan faqat bittasida bajaradi.
+    Qolganlari yetakchi ishni tugatishini kutadi. Yetakchi xato bilan yoki qulab tushsa,
+    kutayotgan jarayonlardan biri yangi yetakchi bo'ladi. Shu jarayon yetakchi bo'lsa True qaytaradi.
+    """
+    done_key = LEADER_DONE_KEY.format(name)
+    lock = redis.lock(LEADER_LOCK_KEY.format(name), timeout=LEADER_LOCK_TTL)
+    while True:
+        if await redis.exists(done_key):
+            return False
+        if await lock.acquire(blocking=False):
+            try:
+                logger.info(f"Jarayon '{name}' uchun yetakchi bo'ldi.")
+                await func()
+                await redis.set(done_key, 1, ex=LEADER_DONE_TTL)
+                return True
+            finally:
+                try:
+                    await lock.release()
+                except LockError:
+                    logger.warning(f"'{name}' yetakchilik qulfi muddatidan oldin tugagan.")
+        await asyncio.sleep(LEADER_POLL_INTERVAL)
@@ -21,5 +21,78 @@ PASS_PERCENTAGE = 92
 # Test variantlari soni (to'g'ri javob + noto'g'ri javoblar)
 TEST_OPTIONS_COUNT = 3
 
+# Takrorlash jadvali (SM-2 uslubida): har bir so'zning osonlik koeffitsienti (ease) va takrorlash oralig'i (kun).
+# To'g'ri javobda oraliq 1 -> 6 -> oraliq * ease kun bo'lib o'sadi va ease oshadi,
+# noto'g'ri javobda oraliq 1 kunga qaytadi va ease kamayadi (SRS_MIN_EASE dan pastga tushmaydi).
+SRS_INITIAL_EASE = 2.5
+SRS_MIN_EASE = 1.3
+SRS_EASE_BONUS = 0.1
+SRS_EASE_PENALTY = 0.2
+SRS_SECOND_INTERVAL = 6
+
+# Webhook serverining jarayonlari soni. 1 dan ko'p bo'lsa, jarayonlar bitta portni bo'lishadi va Redis orqali
+# update'larni takrorlanishdan, foydalanuvchi holatini esa parallel o'zgarishdan himoya qiladi.
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", 1))
+# Bir nechta jarayon rejimida /metrics asosiy portda tasodifiy jarayonga tushadi, shuning uchun
+# i-jarayon o'z ko'rsatkichlarini alohida METRICS_PORT + i portida ham beradi (0 - o'chiq).
+# Prometheus har bir jarayonni alohida target sifatida so'rashi kerak: METRICS_PORT ... METRICS_PORT + WEB_WORKERS - 1
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+# Qabul qilingan update_id lar Redis'da qancha saqlanadi (Telegram qayta yuborganini aniqlash uchun, soniya)
+UPDATE_DEDUP_TTL = int(os.getenv("UPDATE_DEDUP_TTL", 3600))
+
+# Ma'lumotlar bazasi ulanish puli hajmi
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", 10))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", 10))
+# SQL profiler: yoqilganmi, sekin so'rov chegarasi (ms) va sekin so'rovlar uchun EXPLAIN ANALYZE olish ehtimoli (0 - o'chiq)
+DB_PROFILE = os.getenv("DB_PROFILE", "1") == "1"
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", 200))
+DB_EXPLAIN_SAMPLE_RATE = float(os.getenv("DB_EXPLAIN_SAMPLE_RATE", 0))
+
+# Foydalanuvchi ma'lumotlari jarayon ichidagi keshda qancha vaqt saqlanadi (soniya).
+# Bir nechta jarayon rejimida kesh standart bo'yicha o'chiriladi: foydalanuvchining keyingi update'i
+# boshqa jarayonga tushib, eskirgan ma'lumotni ko'rishi mumkin.
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", 60 if WEB_WORKERS == 1 else 0))
+
+# Test javobi tugmalarini imzolash uchun maxfiy kalit (berilmasa BOT_TOKEN dan hosil qilinadi)
+CALLBACK_SECRET = os.getenv("CALLBACK_SECRET")
+
+# Bir vaqtda ishlaydigan handlerlar chegarasi (barcha chatlar uchun umumiy; bitta chat ichida update'lar ketma-ket)
+UPDATE_WORKERS = int(os.getenv("UPDATE_WORKERS", 64))
+# Qayta ishlanishini kutayotgan update'lar uchun navbatning umumiy hajmi
+UPDATE_QUEUE_SIZE = int(os.getenv("UPDATE_QUEUE_SIZE", 10000))
+# To'xtash signalidan (SIGTERM) keyin navbatdagi update'larni qayta ishlab bo'lish uchun beriladigan vaqt (soniya).
+# Platformaning majburiy to'xtatish muddatidan (odatda 30 s) kam bo'lishi kerak.
+SHUTDOWN_TIMEOUT = float(os.getenv("SHUTDOWN_TIMEOUT", 20))
+
+# Telegramga yuborish limitlari: umumiy (xabar/s), har bir chat uchun (xabar/s va ketma-ket yuborish chegarasi)
+SEND_GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", 30))
+SEND_CHAT_RATE = float(os.getenv("SEND_CHAT_RATE", 1))
+SEND_CHAT_BURST = int(os.getenv("SEND_CHAT_BURST", 3))
+# 429 (RetryAfter) javobidan keyin qayta urinishlar soni
+SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", 5))
+# Bot API manzili (bo'sh bo'lsa - api.telegram.org; sinov uchun lokal soxta server ko'rsatilishi mumkin)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")
+
+# Test eslatmalari: tekshiruvlar orasidagi vaqt (soniya) va bazadan bir martada o'qiladigan foydalanuvchilar soni
+REMINDER_INTERVAL = int(os.getenv("REMINDER_INTERVAL", 600))
+REMINDER_BATCH_SIZE = int(os.getenv("REMINDER_BATCH_SIZE", 500))
+
+# Reytinglar (/top): ko'rsatiladigan o'rinlar soni, haftalik foiz reytingiga kirish uchun kerakli javoblar soni
+# va Redis'dagi reytinglarni bazadan qayta qurish oralig'i (soniya)
+LEADERBOARD_SIZE = int(os.getenv("LEADERBOARD_SIZE", 10))
+LEADERBOARD_MIN_WEEKLY_ANSWERS = int(os.getenv("LEADERBOARD_MIN_WEEKLY_ANSWERS", 20))
+LEADERBOARD_RECONCILE_INTERVAL = int(os.getenv("LEADERBOARD_RECONCILE_INTERVAL", 3600))
+
+# Audio kesh sozlamalari (TTS natijalari diskda saqlanadi)
+AUDIO_CACHE_DIR = os.getenv("AUDIO_CACHE_DIR", "audio_cache")
+# Audio keshning maksimal hajmi (baytlarda), oshib ketsa eng eski ishlatilgan fayllar o'chiriladi
+AUDIO_CACHE_MAX_BYTES = int(os.getenv("AUDIO_CACHE_MAX_BYTES", 500 * 1024 * 1024))
+# Bir vaqtda ishlaydigan TTS sintez oqimlari soni
+TTS_MAX_WORKERS = int(os.getenv("TTS_MAX_WORKERS", 4))
+# gTTS ovozi (aksent) - Google domeni, masalan 'com', 'co.uk'
+TTS_VOICE = os.getenv("TTS_VOICE", "com")
+# TTS dvigateli: 'gtts' (Google) yoki 'stub' (tarmoqsiz, test uchun)
+TTS_ENGINE = os.getenv("TTS_ENGINE", "gtts")
+
 # Loglash sozlamalari
 LOGGING_LEVEL = os.getenv("LOGGING_LEVEL", "INFO").upper()
\ No newline at end of file
@@ -1,9 +1,19 @@
 import asyncpg
-from datetime import datetime, timedelta
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta
 import logging
 import random
+import time
 
-from config import DB_URL, WORDS_PER_DAY, PASS_PERCENTAGE
+from config import (
+    DB_URL, WORDS_PER_DAY, PASS_PERCENTAGE, DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_PROFILE,
+    SRS_INITIAL_EASE, SRS_EASE_BONUS, SRS_EASE_PENALTY, SRS_MIN_EASE, SRS_SECOND_INTERVAL
+)
+import migrations
+import vocab_cache
+import user_cache
+import metrics
+import db_profiler
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -11,6 +21,28 @@ logger = logging.getLogger(__name__)
 # Ma'lumotlar bazasi ulanish puli (connection pool)
 db_pool = None
 
+# Har bir funksiyaning bajarilish vaqti /metrics da ko'rinadi
+db_timed = metrics.timed('db_call_duration_seconds')
+
+def get_pool_stats() -> dict:
+    """
+    Ulanish pulining holati: jami, band va maksimal ulanishlar soni.
+    """
+    if db_pool is None:
+        return {}
+    size = db_pool.get_size()
+    return {'size': size, 'in_use': size - db_pool.get_idle_size(), 'max': db_pool.get_max_size()}
+
+@asynccontextmanager
+async def acquire():
+    """
+    Puldan ulanish oladi; ulanishni kutish vaqti so'rovlar vaqtidan alohida yoziladi.
+    """
+    started_at = time.perf_counter()
+    async with db_pool.acquire() as conn:
+        db_profiler.record_acquire(time.perf_counter() - started_at)
+        yield conn
+
 async def init_db_pool():
     """
     Ma'lumotlar bazasi ulanish pulini (connection pool) ishga tushiradi.
@@ -18,7 +50,13 @@ async def init_db_pool():
     global db_pool
     if db_pool is None:
         try:
-            db_pool = await asyncpg.create_pool(DB_URL)
+            db_pool = await asyncpg.create_pool(
+                DB_URL,
+                min_size=DB_POOL_MIN_SIZE,
+                max_size=DB_POOL_MAX_SIZE,
+                connection_class=db_profiler.ProfiledConnection if DB_PROFILE else asyncpg.Connection,
+            )
+            db_profiler.set_pool(db_pool)
             logger.info("Ma'lumotlar bazasi ulanish puli muvaffaqiyatli yaratildi.")
         except Exception as e:
             logger.error(f"Ma'lumotlar bazasi ulanish pulini yaratishda xato: {e}")
@@ -30,64 +68,49 @@ async def close_db_pool():
     """
     global db_pool
     if db_pool:
+        db_profiler.log_summary()
         await db_pool.close()
         logger.info("Ma'lumotlar bazasi ulanish puli yopildi.")
 
+@db_timed
 async def create_tables():
     """
-    Ma'lumotlar bazasida kerakli jadvallarni yaratadi.
+    Ma'lumotlar bazasida kerakli jadvallar va indekslarni yaratadi.
+    Sxema versiyalangan migratsiyalar orqali boshqariladi (migrations.py);
+    sxema dolzarb bo'lsa, hech qanday DDL bajarilmaydi.
     """
-    async with db_pool.acquire() as conn:
-        await conn.execute('''
-            CREATE TABLE IF NOT EXISTS words (
-                id SERIAL PRIMARY KEY,
-                english_word TEXT NOT NULL UNIQUE,
-                uzbek_word TEXT NOT NULL,
-                audio_url TEXT
-            );
-            CREATE TABLE IF NOT EXISTS users (
-                id SERIAL PRIMARY KEY,
-                telegram_id BIGINT NOT NULL UNIQUE,
-                last_word_fetch_date TIMESTAMP DEFAULT NULL,
-                last_test_date TIMESTAMP DEFAULT NULL
-            );
-            CREATE TABLE IF NOT EXISTS user_words (
-                id SERIAL PRIMARY KEY,
-                user_id INTEGER REFERENCES users(id),
-                word_id INTEGER REFERENCES words(id),
-                is_learned BOOLEAN DEFAULT FALSE,
-                correct_attempts INTEGER DEFAULT 0,
-                total_attempts INTEGER DEFAULT 0,
-                last_attempt_date TIMESTAMP DEFAULT NULL,
-                date_assigned TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE (user_id, word_id)
-            );
-        ''')
-        logger.info("Jadvallar muvaffaqiyatli yaratildi (agar mavjud bo'lmasa).")
+    await migrations.run_migrations(db_pool)
 
+@db_timed
 async def add_word(english_word: str, uzbek_word: str, audio_url: str = None):
     """
     Yangi so'zni 'words' jadvaliga qo'shadi.
     """
-    async with db_pool.acquire() as conn:
+    async with acquire() as conn:
         try:
-            await conn.execute('''
+            word_id = await conn.fetchval('''
                 INSERT INTO words (english_word, uzbek_word, audio_url)
                 VALUES ($1, $2, $3)
-                ON CONFLICT (english_word) DO NOTHING;
+                ON CONFLICT (english_word) DO NOTHING
+                RETURNING id;
             ''', english_word, uzbek_word, audio_url)
+            if word_id is not None and vocab_cache.is_loaded:
+                # Lug'at keshini yangi so'z bilan yangilash
+                vocab_cache.add_to_vocabulary(word_id, english_word, uzbek_word, audio_url)
             logger.info(f"So'z qo'shildi/mavjud: {english_word} - {uzbek_word}")
         except Exception as e:
             logger.error(f"So'z qo'shishda xato ({english_word}): {e}")
 
+@db_timed
 async def get_total_words_count():
     """
     Lug'atdagi umumiy so'zlar sonini qaytaradi.
     """
-    async with db_pool.acquire() as conn:
+    async with acquire() as conn:
         count = await conn.fetchval("SELECT COUNT(*) FROM words;")
         return count
 
+@db_timed
 async def add_sample_words():
     """
     Ma'lumotlar bazasiga namunaviy so'zlarni qo'shadi.
@@ -127,71 +150,152 @@ async def add_sample_words():
     logger.info(f"{len(sample_words)} ta namunaviy so'z bazaga qo'shildi.")
 
 
+@db_timed
+async def get_words_batch(after_id: int, limit: int):
+    """
+    Lug'atdagi so'zlarni ID bo'yicha tartiblangan holda, berilgan ID'dan keyin partiyalab qaytaradi.
+    """
+    async with acquire() as conn:
+        words = await conn.fetch('''
+            SELECT id, english_word, uzbek_word FROM words
+            WHERE id > $1
+            ORDER BY id
+            LIMIT $2;
+        ''', after_id, limit)
+        return words
+
+@db_timed
+async def cache_missing_words(word_ids: list[int]):
+    """
+    Lug'at keshida yo'q so'zlarni bazadan o'qib keshga qo'shadi (masalan, import qilingan, lekin kesh hali yangilanmagan so'zlar).
+    """
+    missing_ids = [word_id for word_id in word_ids if vocab_cache.get_word(word_id) is None]
+    if not missing_ids:
+        return
+    async with acquire() as conn:
+        rows = await conn.fetch('''
+            SELECT id, english_word, uzbek_word, audio_url FROM words WHERE id = ANY($1::int[]);
+        ''', missing_ids)
+    for row in rows:
+        vocab_cache.add_to_vocabulary(row['id'], row['english_word'], row['uzbek_word'], row['audio_url'])
+
+@db_timed
 async def get_or_create_user(telegram_id: int):
     """
     Foydalanuvchini topadi yoki yangi foydalanuvchi yaratadi.
+    Natija qisqa muddat keshda saqlanadi, shuning uchun takroriy chaqiruvlar bazaga murojaat qilmaydi.
     """
-    async with db_pool.acquire() as conn:
-        user = await conn.fetchrow("SELECT * FROM users WHERE telegram_id = $1;", telegram_id)
-        if user:
-            return user
-        else:
-            new_user = await conn.fetchrow('''
+    user = user_cache.get_user(telegram_id)
+    if user is not None:
+        return user
+    async with acquire() as conn:
+        # Bitta so'rovda: yo'q bo'lsa yaratish, bor bo'lsa mavjudini qaytarish.
+        # Mavjud foydalanuvchi uchun qatorga hech narsa yozilmaydi.
+        user = await conn.fetchrow('''
+            WITH created AS (
                 INSERT INTO users (telegram_id) VALUES ($1)
-                RETURNING *;
-            ''', telegram_id)
-            logger.info(f"Yangi foydalanuvchi yaratildi: {telegram_id}")
-            return new_user
+                ON CONFLICT (telegram_id) DO NOTHING
+                RETURNING *
+            )
+            SELECT * FROM created
+            UNION ALL
+            SELECT * FROM users WHERE telegram_id = $1
+            LIMIT 1;
+        ''', telegram_id)
+        if user is None:
+            # Foydalanuvchi parallel so'rov tomonidan shu paytda yaratilgan
+            user = await conn.fetchrow("SELECT * FROM users WHERE telegram_id = $1;", telegram_id)
+        return user_cache.put_user(user)
+
+@db_timed
+async def _assign_words(conn, user_id: int, candidate_ids: list[int], limit: int, fetch_date: datetime):
+    """
+    Nomzodlar ichidan foydalanuvchi hali o'rganmagan so'zlarni (ko'pi bilan limit ta) tanlab, unga biriktiradi.
+    So'zlarni tanlash, user_words ga yozish, users va user_stats ni yangilash - bitta atomar so'rovda.
+    Foydalanuvchi qatori FOR UPDATE bilan qulflanadi, shuning uchun bir vaqtdagi chaqiruvlar ketma-ket bajariladi.
+    """
+    return await conn.fetch('''
+        WITH locked_user AS (
+            SELECT id FROM users WHERE id = $1 FOR UPDATE
+        ),
+        picked AS (
+            -- Nomzodlar tasodifiy tartibda keladi; o'rganilganlari (user_id, word_id) indeksi orqali chiqarib tashlanadi
+            SELECT w.id, w.english_word, w.uzbek_word, w.audio_url
+            FROM unnest($4::int[]) WITH ORDINALITY AS c(word_id, position)
+            JOIN words w ON w.id = c.word_id
+            WHERE EXISTS (SELECT 1 FROM locked_user)
+            AND NOT EXISTS (
+                SELECT 1 FROM user_words uw
+                WHERE uw.user_id = $1 AND uw.word_id = c.word_id AND uw.is_learned = TRUE
+            )
+            ORDER BY c.position
+            LIMIT $2
+        ),
+        assigned AS (
+            -- Yangi so'z ertasiga birinchi marta takrorlanadi
+            INSERT INTO user_words (user_id, word_id, date_assigned, due_at, ease)
+            SELECT $1, id, $3, $3 + INTERVAL '1 day', $5 FROM picked
+            ON CONFLICT (user_id, word_id) DO UPDATE SET
+                date_assigned = EXCLUDED.date_assigned, is_learned = FALSE, correct_attempts = 0, total_attempts = 0,
+                ease = EXCLUDED.ease, interval_days = 0, due_at = EXCLUDED.due_at
+        ),
+        fetch_date AS (
+            -- Foydalanuvchining oxirgi so'z olish sanasini yangilash
+            UPDATE users SET last_word_fetch_date = $3
+            WHERE id = $1 AND EXISTS (SELECT 1 FROM picked)
+        ),
+        stats AS (
+            INSERT INTO user_stats (user_id, last_activity_at)
+            SELECT $1, $3 WHERE EXISTS (SELECT 1 FROM picked)
+            ON CONFLICT (user_id) DO UPDATE SET last_activity_at = EXCLUDED.last_activity_at
+        )
+        SELECT id, english_word, uzbek_word, audio_url FROM picked;
+    ''', user_id, limit, fetch_date, candidate_ids, SRS_INITIAL_EASE)
+
+async def _refresh_next_due(conn, user_id: int):
+    # users.next_due_at - eng yaqin takrorlash vaqti: (user_id, due_at) indeksidagi birinchi qator
+    return await conn.fetchval('''
+        UPDATE users SET next_due_at = (SELECT MIN(due_at) FROM user_words WHERE user_id = $1)
+        WHERE id = $1
+        RETURNING next_due_at;
+    ''', user_id)
 
+@db_timed
 async def get_words_for_user(user_id: int, fetch_new: bool = True):
     """
     Foydalanuvchi uchun kunlik 50 ta so'zni qaytaradi.
     Agar fetch_new True bo'lsa, yangi so'zlarni tanlaydi va bazaga yozadi.
     Aks holda, foydalanuvchining o'rganilmagan so'zlarini qaytaradi.
     """
-    async with db_pool.acquire() as conn:
+    async with acquire() as conn:
         if fetch_new:
-            # Foydalanuvchi allaqachon o'rgangan so'zlar ID'sini olish
-            learned_word_ids = await conn.fetch('''
-                SELECT word_id FROM user_words
-                WHERE user_id = $1 AND is_learned = TRUE;
-            ''', user_id)
-            learned_word_ids = [row['word_id'] for row in learned_word_ids]
-
-            # Foydalanuvchiga hali berilmagan yoki o'rganilmagan so'zlarni tanlash
-            new_words = await conn.fetch(f'''
-                SELECT id, english_word, uzbek_word, audio_url FROM words
-                WHERE id NOT IN (SELECT word_id FROM user_words WHERE user_id = $1 AND is_learned = TRUE)
-                ORDER BY RANDOM()
-                LIMIT {WORDS_PER_DAY};
-            ''', user_id)
+            if not vocab_cache.is_loaded:
+                await vocab_cache.load_vocabulary(conn)
+            fetch_date = datetime.now()
+            new_words = []
+            picked_ids = set()
+            candidates_count = WORDS_PER_DAY * 2
+            # Nomzod so'zlar lug'at keshidan bir xil ehtimollik bilan tanlanadi va bazada faqat shu nomzodlar
+            # tekshiriladi, shuning uchun so'rov vaqti lug'at hajmiga bog'liq emas. Nomzodlarning ko'pi allaqachon
+            # o'rganilgan bo'lsa, kamayib qolgan so'zlar uchun nomzodlar soni ikki baravar oshirilib qayta uriniladi.
+            # Barcha urinishlar bitta tranzaksiyada: kunlik so'zlar to'liq beriladi yoki umuman berilmaydi.
+            async with conn.transaction():
+                while len(new_words) < WORDS_PER_DAY:
+                    candidate_ids = vocab_cache.sample_word_ids(candidates_count, picked_ids)
+                    if not candidate_ids:
+                        break
+                    rows = await _assign_words(conn, user_id, candidate_ids, WORDS_PER_DAY - len(new_words), fetch_date)
+                    new_words.extend(rows)
+                    picked_ids.update(candidate_ids)
+                    candidates_count *= 2
+                if new_words:
+                    next_due_at = await _refresh_next_due(conn, user_id)
 
             if not new_words:
-                # Agar yangi so'zlar qolmagan bo'lsa, o'rganilmagan so'zlardan berish
-                new_words = await conn.fetch(f'''
-                    SELECT w.id, w.english_word, w.uzbek_word, w.audio_url
-                    FROM words w
-                    JOIN user_words uw ON w.id = uw.word_id
-                    WHERE uw.user_id = $1 AND uw.is_learned = FALSE
-                    ORDER BY RANDOM()
-                    LIMIT {WORDS_PER_DAY};
-                ''', user_id)
-                if not new_words:
-                    logger.warning(f"Foydalanuvchi {user_id} uchun yangi so'zlar topilmadi va o'rganilmagan so'zlar ham yo'q.")
-                    return [] # Barcha so'zlar o'rganilgan yoki lug'at bo'sh
-
-            # Tanlangan so'zlarni user_words jadvaliga yozish
-            for word in new_words:
-                await conn.execute('''
-                    INSERT INTO user_words (user_id, word_id, date_assigned)
-                    VALUES ($1, $2, $3)
-                    ON CONFLICT (user_id, word_id) DO UPDATE SET date_assigned = $3, is_learned = FALSE, correct_attempts = 0, total_attempts = 0;
-                ''', user_id, word['id'], datetime.now())
-
-            # Foydalanuvchining oxirgi so'z olish sanasini yangilash
-            await conn.execute('''
-                UPDATE users SET last_word_fetch_date = $1 WHERE id = $2;
-            ''', datetime.now(), user_id)
+                logger.warning(f"Foydalanuvchi {user_id} uchun yangi so'zlar topilmadi va o'rganilmagan so'zlar ham yo'q.")
+                return [] # Barcha so'zlar o'rganilgan yoki lug'at bo'sh
+
+            user_cache.update_user(user_id, last_word_fetch_date=fetch_date, next_due_at=next_due_at)
             logger.info(f"Foydalanuvchi {user_id} uchun {len(new_words)} ta yangi so'z berildi.")
             return new_words
         else:
@@ -208,109 +312,299 @@ async def get_words_for_user(user_id: int, fetch_new: bool = True):
             return unlearned_words
 
 
-async def get_random_words_for_options(exclude_word_id: int, count: int):
+@db_timed
+async def load_vocabulary_cache():
     """
-    Test variantlari uchun tasodifiy so'zlarni qaytaradi, berilgan so'zni istisno qilgan holda.
+    Lug'at keshini (vocab_cache) bazadan yuklaydi.
     """
-    async with db_pool.acquire() as conn:
-        words = await conn.fetch('''
-            SELECT id, english_word, uzbek_word FROM words
-            WHERE id != $1
-            ORDER BY RANDOM()
-            LIMIT $2;
-        ''', exclude_word_id, count)
-        return words
+    async with acquire() as conn:
+        await vocab_cache.load_vocabulary(conn)
 
-async def update_user_word_progress(user_id: int, word_id: int, is_correct: bool):
+@db_timed
+async def set_word_audio_file_id(word_id: int, audio_file_id: str = None):
     """
-    Foydalanuvchining so'z bo'yicha progressini yangilaydi.
+    So'z talaffuzining Telegram file_id'sini 'words.audio_url' ustuniga yozadi (None - o'chirish).
     """
-    async with db_pool.acquire() as conn:
-        if is_correct:
-            await conn.execute('''
-                UPDATE user_words SET
-                    correct_attempts = correct_attempts + 1,
-                    total_attempts = total_attempts + 1,
-                    last_attempt_date = $1
-                WHERE user_id = $2 AND word_id = $3;
-            ''', datetime.now(), user_id, word_id)
-        else:
+    async with acquire() as conn:
+        await conn.execute('''
+            UPDATE words SET audio_url = $1 WHERE id = $2;
+        ''', audio_file_id, word_id)
+
+@db_timed
+async def record_test_answers(user_id: int, word_ids: list[int], outcomes: list[bool]):
+    """
+    Test davomida yig'ilgan javoblarni bitta so'rov bilan user_words jadvaliga yozadi.
+    word_ids[i] so'ziga berilgan javob natijasi outcomes[i] da (True - to'g'ri).
+    Shu so'rovning o'zida har bir so'zning keyingi takrorlash vaqti (due_at) SM-2 uslubida hisoblanadi:
+    hamma javob to'g'ri bo'lsa oraliq 1 -> SRS_SECOND_INTERVAL -> oraliq * ease kun, aks holda 1 kun,
+    hamda kunlik faollik (user_daily_activity) va progress yig'indilari (user_stats) yangilanadi.
+    Shu tranzaksiyada foydalanuvchining eng yaqin takrorlash vaqti (users.next_due_at) qayta hisoblanadi.
+    """
+    if not word_ids:
+        return
+    async with acquire() as conn:
+        async with conn.transaction():
             await conn.execute('''
-                UPDATE user_words SET
-                    total_attempts = total_attempts + 1,
-                    last_attempt_date = $1
-                WHERE user_id = $2 AND word_id = $3;
-            ''', datetime.now(), user_id, word_id)
-        logger.info(f"Foydalanuvchi {user_id}, so'z {word_id}: javob {'correct' if is_correct else 'incorrect'}")
+                WITH activity AS (
+                    INSERT INTO user_daily_activity (user_id, day, correct_attempts, total_attempts)
+                    SELECT $1, $4::timestamp::date, COUNT(*) FILTER (WHERE is_correct), COUNT(*)
+                    FROM unnest($3::bool[]) AS t(is_correct)
+                    ON CONFLICT (user_id, day) DO UPDATE SET
+                        correct_attempts = user_daily_activity.correct_attempts + EXCLUDED.correct_attempts,
+                        total_attempts = user_daily_activity.total_attempts + EXCLUDED.total_attempts
+                ),
+                stats AS (
+                    INSERT INTO user_stats (user_id, total_attempts, correct_attempts, last_activity_at)
+                    SELECT $1, COUNT(*), COUNT(*) FILTER (WHERE is_correct), $4
+                    FROM unnest($3::bool[]) AS t(is_correct)
+                    ON CONFLICT (user_id) DO UPDATE SET
+                        total_attempts = user_stats.total_attempts + EXCLUDED.total_attempts,
+                        correct_attempts = user_stats.correct_attempts + EXCLUDED.correct_attempts,
+                        last_activity_at = EXCLUDED.last_activity_at
+                )
+                UPDATE user_words uw SET
+                    correct_attempts = uw.correct_attempts + s.correct,
+                    total_attempts = uw.total_attempts + s.total,
+                    last_attempt_date = $4,
+                    ease = s.ease,
+                    interval_days = s.interval_days,
+                    due_at = $4 + s.interval_days * INTERVAL '1 day'
+                FROM (
+                    SELECT a.word_id, a.correct, a.total,
+                           CASE WHEN a.correct = a.total THEN cur.ease + $5 ELSE GREATEST($7, cur.ease - $6) END AS ease,
+                           CASE WHEN a.correct < a.total OR cur.interval_days = 0 THEN 1
+                                WHEN cur.interval_days = 1 THEN $8
+                                ELSE CEIL(cur.interval_days * cur.ease)::int END AS interval_days
+                    FROM (
+                        SELECT word_id, COUNT(*) FILTER (WHERE is_correct) AS correct, COUNT(*) AS total
+                        FROM unnest($2::int[], $3::bool[]) AS t(word_id, is_correct)
+                        GROUP BY word_id
+                    ) a
+                    JOIN user_words cur ON cur.user_id = $1 AND cur.word_id = a.word_id
+                ) s
+                WHERE uw.user_id = $1 AND uw.word_id = s.word_id;
+            ''', user_id, word_ids, outcomes, datetime.now(),
+                SRS_EASE_BONUS, SRS_EASE_PENALTY, SRS_MIN_EASE, SRS_SECOND_INTERVAL)
+            next_due_at = await _refresh_next_due(conn, user_id)
+    user_cache.update_user(user_id, next_due_at=next_due_at)
+    logger.info(f"Foydalanuvchi {user_id}: {len(word_ids)} ta javob bazaga yozildi.")
 
+@db_timed
 async def get_user_test_words(user_id: int):
     """
-    Foydalanuvchi uchun testga tayyor bo'lgan so'zlarni qaytaradi.
-    Bu so'zlar kecha berilgan va hali o'rganilmagan so'zlar bo'lishi kerak.
+    Foydalanuvchi uchun takrorlash vaqti kelgan (due_at <= hozir) so'zlarni qaytaradi,
+    eng ko'p kechikkanlaridan boshlab, ko'pi bilan WORDS_PER_DAY ta.
+    So'rov (user_id, due_at) indeksi bo'yicha bajariladi, shuning uchun vaqti foydalanuvchi tarixi hajmiga bog'liq emas.
     """
-    async with db_pool.acquire() as conn:
-        # Kecha berilgan va hali o'rganilmagan so'zlarni olish
-        # Bugun ertalab so'z olgan bo'lsa, kechagi so'zlarni test qilish kerak.
-        # last_word_fetch_date dan 24 soat o'tgan bo'lsa testga tayyor deb hisoblaymiz.
+    async with acquire() as conn:
         words = await conn.fetch(f'''
             SELECT w.id, w.english_word, w.uzbek_word, w.audio_url,
                    uw.correct_attempts, uw.total_attempts
-            FROM words w
-            JOIN user_words uw ON w.id = uw.word_id
-            WHERE uw.user_id = $1 AND uw.is_learned = FALSE
-            AND uw.date_assigned >= (NOW() - INTERVAL '2 days') -- Oxirgi 2 kun ichida berilgan so'zlar
-            ORDER BY uw.date_assigned DESC
+            FROM user_words uw
+            JOIN words w ON w.id = uw.word_id
+            WHERE uw.user_id = $1 AND uw.due_at <= $2
+            ORDER BY uw.due_at
             LIMIT {WORDS_PER_DAY};
-        ''', user_id)
+        ''', user_id, datetime.now())
         return words
 
-async def calculate_test_result(user_id: int, word_ids: list[int]):
+@db_timed
+async def calculate_test_result(user_id: int, word_ids: list[int], correct_count: int = None):
     """
     Foydalanuvchining test natijasini hisoblaydi va so'zlarni yangilaydi.
+    Agar correct_count (testdagi to'g'ri javoblar soni) berilsa, natija shundan hisoblanadi,
+    aks holda so'zlar bo'yicha jami urinishlar bitta agregat so'rov bilan olinadi.
+    Natija shu tranzaksiyaning o'zida user_stats ga yoziladi.
+    (foiz, shu testda yangi o'rganilgan so'zlar soni) qaytaradi.
     """
-    async with db_pool.acquire() as conn:
-        total_correct = 0
-        total_attempts = 0
-
-        # Faqat joriy testdagi so'zlar uchun natijalarni olish
-        for word_id in word_ids:
-            row = await conn.fetchrow('''
-                SELECT correct_attempts, total_attempts FROM user_words
-                WHERE user_id = $1 AND word_id = $2;
-            ''', user_id, word_id)
-            if row:
-                total_correct += row['correct_attempts']
-                total_attempts += row['total_attempts']
-
-        if total_attempts == 0:
-            return 0.0 # Agar hech qanday urinish bo'lmasa
-
-        percentage = (total_correct / total_attempts) * 100
-        logger.info(f"Foydalanuvchi {user_id} test natijasi: {percentage:.2f}%")
-
-        if percentage >= PASS_PERCENTAGE:
-            # So'zlarni "o'rganilgan" deb belgilash
-            for word_id in word_ids:
-                await conn.execute('''
+    async with acquire() as conn:
+        async with conn.transaction():
+            if correct_count is not None:
+                total_correct = correct_count
+                total_attempts = len(word_ids)
+            else:
+                # Faqat joriy testdagi so'zlar uchun natijalarni olish
+                row = await conn.fetchrow('''
+                    SELECT COALESCE(SUM(correct_attempts), 0) AS total_correct,
+                           COALESCE(SUM(total_attempts), 0) AS total_attempts
+                    FROM user_words
+                    WHERE user_id = $1 AND word_id = ANY($2::int[]);
+                ''', user_id, word_ids)
+                total_correct = row['total_correct']
+                total_attempts = row['total_attempts']
+
+            if total_attempts == 0:
+                return 0.0, 0 # Agar hech qanday urinish bo'lmasa
+
+            percentage = (total_correct / total_attempts) * 100
+            logger.info(f"Foydalanuvchi {user_id} test natijasi: {percentage:.2f}%")
+            passed = percentage >= PASS_PERCENTAGE
+            newly_learned = 0
+
+            if passed:
+                # So'zlarni "o'rganilgan" deb belgilash
+                # Takrorlash testidagi avval o'rganilgan so'zlar qayta sanalmaydi
+                status = await conn.execute('''
                     UPDATE user_words SET is_learned = TRUE
-                    WHERE user_id = $1 AND word_id = $2;
-                ''', user_id, word_id)
-            logger.info(f"Foydalanuvchi {user_id} testdan o'tdi. So'zlar o'rganilgan deb belgilandi.")
-            return percentage
-        else:
-            # So'zlarni qayta urinish uchun tayyor holatga qaytarish
-            # Ya'ni, is_learned FALSE qoladi, correct_attempts va total_attempts nolga qaytarilmaydi
-            # Lekin keyingi kun yana shu so'zlar test qilinadi.
-            logger.info(f"Foydalanuvchi {user_id} testdan o'tmadi. So'zlar qayta takrorlanadi.")
-            return percentage
+                    WHERE user_id = $1 AND word_id = ANY($2::int[]) AND is_learned = FALSE;
+                ''', user_id, word_ids)
+                newly_learned = int(status.rsplit(' ', 1)[-1])
+                logger.info(f"Foydalanuvchi {user_id} testdan o'tdi. {newly_learned} ta so'z o'rganilgan deb belgilandi.")
+            else:
+                # So'zlarni qayta urinish uchun tayyor holatga qaytarish
+                # Ya'ni, is_learned FALSE qoladi, correct_attempts va total_attempts nolga qaytarilmaydi
+                # Lekin keyingi kun yana shu so'zlar test qilinadi.
+                logger.info(f"Foydalanuvchi {user_id} testdan o'tmadi. So'zlar qayta takrorlanadi.")
 
+            await conn.execute('''
+                INSERT INTO user_stats (user_id, learned_count, tests_passed, tests_failed, last_activity_at)
+                VALUES ($1, $2, $3, $4, $5)
+                ON CONFLICT (user_id) DO UPDATE SET
+                    learned_count = user_stats.learned_count + EXCLUDED.learned_count,
+                    tests_passed = user_stats.tests_passed + EXCLUDED.tests_passed,
+                    tests_failed = user_stats.tests_failed + EXCLUDED.tests_failed,
+                    last_activity_at = EXCLUDED.last_activity_at;
+            ''', user_id, newly_learned, int(passed), int(not passed), datetime.now())
+            return percentage, newly_learned
+
+@db_timed
 async def update_user_last_test_date(user_id: int):
     """
     Foydalanuvchining oxirgi test sanasini yangilaydi.
     """
-    async with db_pool.acquire() as conn:
+    test_date = datetime.now()
+    async with acquire() as conn:
         await conn.execute('''
             UPDATE users SET last_test_date = $1 WHERE id = $2;
-        ''', datetime.now(), user_id)
+        ''', test_date, user_id)
+        user_cache.update_user(user_id, last_test_date=test_date)
         logger.info(f"Foydalanuvchi {user_id} oxirgi test sanasi yangilandi.")
 
+@db_timed
+async def get_user_stats(user_id: int):
+    """
+    Foydalanuvchi progressining yig'indilari (user_stats qatori, bo'lmasa None).
+    Birlamchi kalit bo'yicha bitta qator o'qiladi, user_words bo'yicha agregat hisoblanmaydi.
+    """
+    async with acquire() as conn:
+        return await conn.fetchrow('''
+            SELECT learned_count, total_attempts, correct_attempts, tests_passed, tests_failed, last_activity_at
+            FROM user_stats WHERE user_id = $1;
+        ''', user_id)
+
+
+async def iter_test_due_users(now: datetime, batch_size: int):
+    """
+    Takrorlash vaqti kelgan so'zi bor (users.next_due_at <= hozir), lekin oxirgi faolligidan
+    (so'z olish yoki test) keyin hali eslatma olmagan foydalanuvchilarning ID'larini partiyalab qaytaradi.
+    Faqat vaqti kelgan qatorlar (next_due_at, id) indeksi bo'yicha o'qiladi, shuning uchun aylanma narxi
+    foydalanuvchilar soniga emas, vaqti kelganlar soniga bog'liq. Partiyalar indeks kaliti bo'yicha
+    alohida qisqa so'rovlar bilan o'qiladi: uzoq tranzaksiya ochiq turmaydi.
+    """
+    last_due_at, last_id = datetime.min, 0
+    while True:
+        async with acquire() as conn:
+            rows = await conn.fetch('''
+                SELECT id, next_due_at FROM users
+                WHERE next_due_at <= $1 AND (next_due_at, id) > ($2, $3)
+                AND (test_reminder_sent_at IS NULL
+                     OR test_reminder_sent_at < GREATEST(last_word_fetch_date, last_test_date))
+                ORDER BY next_due_at, id
+                LIMIT $4;
+            ''', now, last_due_at, last_id, batch_size)
+        if not rows:
+            return
+        last_due_at, last_id = rows[-1]['next_due_at'], rows[-1]['id']
+        yield [row['id'] for row in rows]
+        if len(rows) < batch_size:
+            return
+
+@db_timed
+async def claim_test_reminders(user_ids: list[int], now: datetime):
+    """
+    Eslatma yuboriladigan foydalanuvchilarni belgilaydi va ularning telegram_id larini qaytaradi.
+    Shart UPDATE ichida qayta tekshiriladi, shuning uchun bir nechta jarayon bir foydalanuvchiga
+    ikki marta eslatma yubora olmaydi: qatorni faqat birinchi bo'lib belgilagan jarayon oladi.
+    """
+    async with acquire() as conn:
+        rows = await conn.fetch('''
+            UPDATE users SET test_reminder_sent_at = $2
+            WHERE id = ANY($1::int[])
+            AND next_due_at <= $2
+            AND (test_reminder_sent_at IS NULL
+                 OR test_reminder_sent_at < GREATEST(last_word_fetch_date, last_test_date))
+            RETURNING telegram_id;
+        ''', user_ids, now)
+        return [row['telegram_id'] for row in rows]
+
+
+async def _iter_batches(query: str, *args, batch_size: int):
+    # Natijani user_id bo'yicha partiyalab o'qish: so'rovda $1 - oldingi partiyaning oxirgi user_id si,
+    # $2 - partiya hajmi, qolgan parametrlar $3 dan boshlanadi. Har bir partiya alohida qisqa so'rov.
+    last_id = 0
+    while True:
+        async with acquire() as conn:
+            rows = await conn.fetch(query, last_id, batch_size, *args)
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield [tuple(row) for row in rows]
+        if len(rows) < batch_size:
+            return
+
+
+def iter_learned_counts(batch_size: int):
+    """
+    Har bir foydalanuvchining o'rganilgan so'zlari soni: (user_id, soni) partiyalari.
+    user_words bo'yicha to'liq agregat - faqat reytinglarni fonda qayta qurish uchun.
+    """
+    return _iter_batches('''
+        SELECT user_id, COUNT(*) FROM user_words
+        WHERE user_id > $1 AND is_learned = TRUE
+        GROUP BY user_id
+        ORDER BY user_id
+        LIMIT $2;
+    ''', batch_size=batch_size)
+
+
+def iter_activity_totals(since: date, batch_size: int):
+    """
+    since kunidan beri berilgan javoblar: (user_id, to'g'ri, jami) partiyalari.
+    """
+    return _iter_batches('''
+        SELECT user_id, SUM(correct_attempts)::int, SUM(total_attempts)::int
+        FROM user_daily_activity
+        WHERE user_id > $1 AND day >= $3
+        GROUP BY user_id
+        ORDER BY user_id
+        LIMIT $2;
+    ''', since, batch_size=batch_size)
+
+
+def iter_streaks(batch_size: int):
+    """
+    Kunlik faollikdan hisoblangan seriyalar: (user_id, oxirgi seriya, eng uzun seriya, oxirgi faol kun) partiyalari.
+    Ketma-ket kunlar "kun - tartib raqami" bir xil bo'lgan guruhni tashkil qiladi.
+    """
+    return _iter_batches('''
+        WITH batch_users AS (
+            SELECT DISTINCT user_id FROM user_daily_activity
+            WHERE user_id > $1
+            ORDER BY user_id
+            LIMIT $2
+        ),
+        numbered AS (
+            SELECT user_id, day, day - (ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY day))::int AS island
+            FROM user_daily_activity
+            WHERE user_id IN (SELECT user_id FROM batch_users)
+        ),
+        islands AS (
+            SELECT user_id, COUNT(*) AS length, MAX(day) AS last_day
+            FROM numbered
+            GROUP BY user_id, island
+        )
+        SELECT user_id, (ARRAY_AGG(length ORDER BY last_day DESC))[1]::int, MAX(length)::int, MAX(last_day)
+        FROM islands
+        GROUP BY user_id
+        ORDER BY user_id;
+    ''', batch_size=batch_size)
@@ -0,0 +1,257 @@
+import asyncio
+from contextvars import ContextVar
+import logging
+import random
+import re
+import time
+
+import asyncpg
+
+from config import DB_PROFILE, DB_SLOW_QUERY_MS, DB_EXPLAIN_SAMPLE_RATE
+import metrics
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# SQL so'rovlar profileri: ulanish pulidagi har bir ulanish ProfiledConnection bo'ladi.
+# Har bir so'rov normallashtirilgan matni bo'yicha guruhlanadi (izohlar, ortiqcha bo'sh joylar
+# va literallar olib tashlanadi) va chaqiruvlar soni, jami/eng uzoq vaqt hamda qaytgan qatorlar yig'iladi.
+# DB_SLOW_QUERY_MS dan sekin so'rovlar logga yoziladi. DB_EXPLAIN_SAMPLE_RATE > 0 bo'lsa, o'z guruhida
+# eng sekin bo'lgan so'rovlarning bir qismi uchun fonda reja olinadi (bekor qilinadigan tranzaksiya ichida).
+# EXPLAIN ANALYZE so'rovni haqiqatan qayta bajaradi: bekor qilish sequence qiymatlarini, qator qulflarini va
+# advisory lock'larni qaytarmaydi. Shuning uchun ANALYZE faqat jadvaldan o'qiydigan oddiy SELECT/WITH uchun,
+# yozuvchi (INSERT/UPDATE/DELETE, FOR UPDATE/SHARE) so'rovlar uchun esa bajarmaydigan oddiy EXPLAIN olinadi.
+# Jadvalsiz funksiya chaqiruvlari (SELECT pg_advisory_lock($1) kabi) va yon ta'sirli funksiyalar umuman tekshirilmaydi.
+# Puldan ulanish olishni kutish vaqti (acquire) bajarilish vaqtidan alohida hisoblanadi.
+EXPLAINABLE_PREFIXES = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE')
+SUMMARY_LIMIT = 20
+
+_COMMENT_RE = re.compile(r'--[^\n]*')
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'(?<![$\w])\d+(?:\.\d+)?\b') # $1 kabi parametrlar o'zgarmaydi
+_SPACE_RE = re.compile(r'\s+')
+_WRITE_RE = re.compile(r'\b(INSERT|UPDATE|DELETE|MERGE)\b|\bFOR\s+(NO\s+KEY\s+)?(UPDATE|SHARE|KEY\s+SHARE)\b', re.IGNORECASE)
+_SIDE_EFFECT_RE = re.compile(r'\b(pg_(try_)?advisory\w*|nextval|setval|pg_sleep\w*|pg_notify|set_config|pg_terminate_backend|pg_cancel_backend)\s*\(', re.IGNORECASE)
+_FROM_RE = re.compile(r'\bFROM\b', re.IGNORECASE)
+
+_normalized = {} # xom SQL -> normallashtirilgan SQL (so'rovlar matni o'zgarmas, shuning uchun kesh kichik)
+_stats = {} # normallashtirilgan SQL -> [chaqiruvlar, jami soniya, eng uzoq soniya, qatorlar, xatolar]
+_acquire = {'count': 0, 'total': 0.0, 'max': 0.0}
+_explaining = ContextVar('db_explaining', default=False)
+_explain_tasks = set()
+_pool = None
+
+
+def normalize_query(query: str) -> str:
+    """
+    So'rovni guruhlash uchun normallashtiradi: izohlar olib tashlanadi, literallar '?' bilan almashtiriladi.
+    """
+    normalized = _normalized.get(query)
+    if normalized is None:
+        normalized = _COMMENT_RE.sub(' ', query)
+        normalized = _STRING_RE.sub('?', normalized)
+        normalized = _NUMBER_RE.sub('?', normalized)
+        normalized = _SPACE_RE.sub(' ', normalized).strip().rstrip(';').strip()
+        _normalized[query] = normalized
+    return normalized
+
+
+def _rows_from_status(status) -> int:
+    # execute() "UPDATE 5", "INSERT 0 3" kabi holat qatorini qaytaradi
+    if isinstance(status, str):
+        last = status.rsplit(' ', 1)[-1]
+        if last.isdigit():
+            return int(last)
+    return 0
+
+
+def _record(query: str, args, elapsed: float, rows: int, failed: bool):
+    if _explaining.get():
+        return
+    normalized = normalize_query(query)
+    entry = _stats.get(normalized)
+    if entry is None:
+        entry = _stats[normalized] = [0, 0.0, 0.0, 0, 0]
+    is_slowest = elapsed > entry[2]
+    entry[0] += 1
+    entry[1] += elapsed
+    entry[2] = max(entry[2], elapsed)
+    entry[3] += rows
+    entry[4] += failed
+
+    if elapsed * 1000 >= DB_SLOW_QUERY_MS:
+        logger.warning(f"Sekin so'rov ({elapsed * 1000:.1f} ms, {rows} qator): {normalized[:500]}")
+        if is_slowest and DB_EXPLAIN_SAMPLE_RATE and random.random() < DB_EXPLAIN_SAMPLE_RATE:
+            _schedule_explain(query, args, normalized)
+
+
+def record_acquire(elapsed: float):
+    """
+    Puldan ulanish olishni kutish vaqtini yozadi.
+    """
+    _acquire['count'] += 1
+    _acquire['total'] += elapsed
+    _acquire['max'] = max(_acquire['max'], elapsed)
+    metrics.observe('db_pool_acquire_wait_seconds', elapsed)
+
+
+def explain_mode(normalized: str):
+    """
+    So'rov uchun qanday EXPLAIN olish mumkinligini aniqlaydi:
+    'analyze' - faqat o'qiydigan so'rov, 'plain' - yozuvchi so'rov (bajarilmaydi), None - tekshirilmaydi.
+    """
+    if not normalized.upper().startswith(EXPLAINABLE_PREFIXES) or _SIDE_EFFECT_RE.search(normalized):
+        return None
+    if _WRITE_RE.search(normalized):
+        return 'plain'
+    if not _FROM_RE.search(normalized):
+        # Faqat funksiya chaqiruvi - rejasi yo'q, qayta bajarish esa yon ta'sirni takrorlashi mumkin
+        return None
+    return 'analyze'
+
+
+def _schedule_explain(query: str, args, normalized: str):
+    mode = explain_mode(normalized)
+    if _pool is None or mode is None:
+        return
+    task = asyncio.get_running_loop().create_task(_explain(query, args, normalized, mode))
+    _explain_tasks.add(task)
+    task.add_done_callback(_explain_tasks.discard)
+
+
+async def _explain(query: str, args, normalized: str, mode: str):
+    _explaining.set(True)
+    options = "(ANALYZE, BUFFERS)" if mode == 'analyze' else ""
+    try:
+        async with _pool.acquire() as conn:
+            transaction = conn.transaction(readonly=mode == 'analyze')
+            await transaction.start()
+            try:
+                plan = await conn.fetch(f"EXPLAIN {options} {query}", *args)
+            finally:
+                await transaction.rollback()
+        plan_text = '\n'.join(row[0] for row in plan)
+        logger.warning(f"Sekin so'rov rejasi: {normalized[:500]}\n{plan_text}")
+    except Exception as e:
+        logger.info(f"EXPLAIN olinmadi ({normalized[:100]}): {e}")
+
+
+class ProfiledConnection(asyncpg.Connection):
+    """
+    So'rovlar vaqti va qaytgan qatorlar sonini profilerga yozadigan asyncpg ulanishi.
+    """
+
+    async def execute(self, query: str, *args, timeout=None):
+        started_at = time.perf_counter()
+        status = None
+        try:
+            status = await super().execute(query, *args, timeout=timeout)
+            return status
+        finally:
+            _record(query, args, time.perf_counter() - started_at, _rows_from_status(status), status is None)
+
+    async def executemany(self, command: str, args, *, timeout=None):
+        started_at = time.perf_counter()
+        failed = True
+        try:
+            result = await super().executemany(command, args, timeout=timeout)
+            failed = False
+            return result
+        finally:
+            _record(command, (), time.perf_counter() - started_at, 0, failed)
+
+    async def fetch(self, query, *args, timeout=None, record_class=None):
+        started_at = time.perf_counter()
+        rows = None
+        try:
+            rows = await super().fetch(query, *args, timeout=timeout, record_class=record_class)
+            return rows
+        finally:
+            _record(query, args, time.perf_counter() - started_at, len(rows) if rows is not None else 0, rows is None)
+
+    async def fetchrow(self, query, *args, timeout=None, record_class=None):
+        started_at = time.perf_counter()
+        failed = True
+        row = None
+        try:
+            row = await super().fetchrow(query, *args, timeout=timeout, record_class=record_class)
+            failed = False
+            return row
+        finally:
+            _record(query, args, time.perf_counter() - started_at, int(row is not None), failed)
+
+    async def fetchval(self, query, *args, column=0, timeout=None):
+        started_at = time.perf_counter()
+        failed = True
+        try:
+            value = await super().fetchval(query, *args, column=column, timeout=timeout)
+            failed = False
+            return value
+        finally:
+            _record(query, args, time.perf_counter() - started_at, int(not failed), failed)
+
+
+def set_pool(pool):
+    """
+    EXPLAIN uchun ishlatiladigan pulni belgilaydi.
+    """
+    global _pool
+    _pool = pool
+
+
+def get_summary(limit: int = SUMMARY_LIMIT) -> dict:
+    """
+    Jami vaqt bo'yicha eng og'ir so'rovlar va ulanish kutish statistikasi.
+    """
+    queries = []
+    for normalized, (calls, total, slowest, rows, errors) in sorted(_stats.items(), key=lambda item: item[1][1], reverse=True)[:limit]:
+        queries.append({
+            'query': normalized,
+            'calls': calls,
+            'total_ms': round(total * 1000, 2),
+            'avg_ms': round(total / calls * 1000, 3),
+            'max_ms': round(slowest * 1000, 2),
+            'rows': rows,
+            'errors': errors,
+        })
+    acquire_count = _acquire['count']
+    return {
+        'queries': queries,
+        'acquire': {
+            'count': acquire_count,
+            'total_ms': round(_acquire['total'] * 1000, 2),
+            'avg_ms': round(_acquire['total'] / acquire_count * 1000, 3) if acquire_count else 0,
+            'max_ms': round(_acquire['max'] * 1000, 2),
+        },
+    }
+
+
+def format_summary(limit: int = SUMMARY_LIMIT) -> str:
+    summary = get_summary(limit)
+    acquire = summary['acquire']
+    lines = [
+        f"Ulanish kutish: {acquire['count']} marta, o'rtacha {acquire['avg_ms']} ms, eng uzoq {acquire['max_ms']} ms",
+        f"{'chaqiruv':>9} {'jami_ms':>10} {'ortacha_ms':>10} {'max_ms':>9} {'qatorlar':>9} {'xato':>5}  so'rov",
+    ]
+    for query in summary['queries']:
+        lines.append(
+            f"{query['calls']:>9} {query['total_ms']:>10} {query['avg_ms']:>10} {query['max_ms']:>9} "
+            f"{query['rows']:>9} {query['errors']:>5}  {query['query'][:160]}"
+        )
+    return '\n'.join(lines)
+
+
+def log_summary():
+    """
+    Profil xulosasini logga yozadi (to'xtashda yoki SIGUSR1 signali bilan).
+    """
+    if DB_PROFILE and _stats:
+        logger.info("SQL profil xulosasi:\n" + format_summary())
+
+
+def reset():
+    _stats.clear()
+    _acquire.update(count=0, total=0.0, max=0.0)
+
+
+metrics.describe('db_pool_acquire_wait_seconds', 'histogram', "Puldan ulanish olishni kutish vaqti")
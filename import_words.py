@@ -0,0 +1,207 @@
+"""
+Lug'atni fayldan ommaviy import qilish (CSV, TSV yoki JSONL).
+
+Fayl oqim bilan o'qiladi va asyncpg COPY orqali vaqtinchalik jadvalga yuklanadi,
+so'ng bitta so'rov bilan 'words' jadvaliga birlashtiriladi. Import alohida ulanishdan
+foydalanadi, shuning uchun ishlayotgan botning ulanish puli band bo'lib qolmaydi.
+
+Ishlatish:
+    python import_words.py dictionary.csv
+    python import_words.py dictionary.jsonl --dry-run
+    python import_words.py fixes.tsv --mode update
+"""
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import time
+
+import asyncpg
+
+from config import DB_URL, REDIS_URL
+from vocab_cache import VOCAB_VERSION_KEY
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# COPY ga bir martada yuboriladigan qatorlar soni
+COPY_CHUNK_SIZE = 10_000
+
+# Import rejimlari:
+#   upsert - yangi so'zlarni qo'shish, mavjudlarining tarjimasini yangilash
+#   update - faqat mavjud so'zlarning tarjimasini yangilash (delta), yangi so'z qo'shilmaydi
+IMPORT_MODES = ('upsert', 'update')
+
+
+def detect_format(path: str) -> str:
+    """
+    Fayl formatini kengaytmasi bo'yicha aniqlaydi.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    if extension in ('.tsv', '.tab'):
+        return 'tsv'
+    return 'csv'
+
+
+def read_pairs(path: str, file_format: str):
+    """
+    Fayldan (english_word, uzbek_word) juftliklarini oqim bilan o'qiydi.
+    CSV/TSV da 'english_word'/'uzbek_word' sarlavhasi bo'lishi mumkin, aks holda birinchi ikki ustun olinadi.
+    JSONL da har bir qator {"english_word": ..., "uzbek_word": ...} obyekti.
+    """
+    with open(path, encoding='utf-8', newline='') as f:
+        if file_format == 'jsonl':
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                item = json.loads(line)
+                yield item['english_word'], item['uzbek_word']
+            return
+
+        reader = csv.reader(f, delimiter='\t' if file_format == 'tsv' else ',')
+        for i, row in enumerate(reader):
+            if len(row) < 2:
+                continue
+            if i == 0 and row[0].strip().lower() in ('english_word', 'english'):
+                continue
+            yield row[0], row[1]
+
+
+def _clean_pairs(pairs):
+    """
+    Bo'sh joylarni olib tashlaydi va to'liq bo'lmagan qatorlarni o'tkazib yuboradi.
+    """
+    for english_word, uzbek_word in pairs:
+        english_word = english_word.strip()
+        uzbek_word = uzbek_word.strip()
+        if english_word and uzbek_word:
+            yield english_word, uzbek_word
+
+
+def _chunks(pairs, size: int):
+    chunk = []
+    for pair in pairs:
+        chunk.append(pair)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def import_words(pairs, mode: str = 'upsert', dry_run: bool = False, conn=None) -> dict:
+    """
+    So'z juftliklarini 'words' jadvaliga import qiladi va statistikani qaytaradi.
+    dry_run bo'lsa hamma ish bajariladi, lekin tranzaksiya bekor qilinadi.
+    """
+    if mode not in IMPORT_MODES:
+        raise ValueError(f"Noma'lum import rejimi: {mode}")
+
+    own_connection = conn is None
+    if own_connection:
+        conn = await asyncpg.connect(DB_URL)
+    started_at = time.monotonic()
+    stats = {'read': 0, 'inserted': 0, 'updated': 0, 'dry_run': dry_run}
+    try:
+        transaction = conn.transaction()
+        await transaction.start()
+        try:
+            # line_no - juftlikning fayldagi tartib raqami: takroriy so'zlardan oxirgisini aniqlash uchun
+            # (ctid qo'shilish tartibini kafolatlamaydi)
+            await conn.execute('''
+                CREATE TEMP TABLE words_staging (
+                    line_no BIGINT NOT NULL,
+                    english_word TEXT NOT NULL,
+                    uzbek_word TEXT NOT NULL
+                ) ON COMMIT DROP;
+            ''')
+            records = ((line_no, english_word, uzbek_word)
+                       for line_no, (english_word, uzbek_word) in enumerate(_clean_pairs(pairs), 1))
+            for chunk in _chunks(records, COPY_CHUNK_SIZE):
+                await conn.copy_records_to_table('words_staging', records=chunk, columns=['line_no', 'english_word', 'uzbek_word'])
+                stats['read'] += len(chunk)
+                logger.info(f"Yuklandi: {stats['read']} qator")
+
+            if mode == 'upsert':
+                # Fayldagi takroriy so'zlardan oxirgisi olinadi; tarjimasi o'zgarmagan so'zlar qayta yozilmaydi
+                rows = await conn.fetch('''
+                    INSERT INTO words (english_word, uzbek_word)
+                    SELECT DISTINCT ON (english_word) english_word, uzbek_word
+                    FROM words_staging
+                    ORDER BY english_word, line_no DESC
+                    ON CONFLICT (english_word) DO UPDATE SET uzbek_word = EXCLUDED.uzbek_word
+                    WHERE words.uzbek_word IS DISTINCT FROM EXCLUDED.uzbek_word
+                    RETURNING (xmax = 0) AS inserted;
+                ''')
+                stats['inserted'] = sum(1 for row in rows if row['inserted'])
+                stats['updated'] = len(rows) - stats['inserted']
+            else:
+                status = await conn.execute('''
+                    UPDATE words w SET uzbek_word = s.uzbek_word
+                    FROM (
+                        SELECT DISTINCT ON (english_word) english_word, uzbek_word
+                        FROM words_staging
+                        ORDER BY english_word, line_no DESC
+                    ) s
+                    WHERE w.english_word = s.english_word
+                    AND w.uzbek_word IS DISTINCT FROM s.uzbek_word;
+                ''')
+                stats['updated'] = int(status.split()[-1])
+        except Exception:
+            await transaction.rollback()
+            raise
+        else:
+            if dry_run:
+                await transaction.rollback()
+            else:
+                await transaction.commit()
+    finally:
+        if own_connection:
+            await conn.close()
+
+    elapsed = time.monotonic() - started_at
+    stats['seconds'] = round(elapsed, 3)
+    stats['rows_per_second'] = round(stats['read'] / elapsed) if elapsed else 0
+    logger.info(
+        f"Import {'(sinov) ' if dry_run else ''}tugadi: {stats['read']} qator {elapsed:.2f} soniyada "
+        f"({stats['rows_per_second']} qator/s), qo'shildi: {stats['inserted']}, yangilandi: {stats['updated']}."
+    )
+    return stats
+
+
+async def notify_vocabulary_changed():
+    """
+    Ishlayotgan bot jarayonlariga lug'at keshini qayta yuklash kerakligini bildiradi.
+    """
+    if not REDIS_URL:
+        return
+    from redis.asyncio import Redis
+    redis = Redis.from_url(REDIS_URL)
+    try:
+        await redis.incr(VOCAB_VERSION_KEY)
+    finally:
+        await redis.aclose()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Lug'atni fayldan ommaviy import qilish")
+    parser.add_argument("path", help="CSV, TSV yoki JSONL fayl")
+    parser.add_argument("--format", choices=('csv', 'tsv', 'jsonl'), help="Fayl formati (standart: kengaytmadan)")
+    parser.add_argument("--mode", choices=IMPORT_MODES, default='upsert', help="Import rejimi")
+    parser.add_argument("--dry-run", action="store_true", help="Bazaga yozmasdan natijani ko'rsatish")
+    args = parser.parse_args()
+
+    pairs = read_pairs(args.path, args.format or detect_format(args.path))
+    stats = await import_words(pairs, mode=args.mode, dry_run=args.dry_run)
+    if not args.dry_run and (stats['inserted'] or stats['updated']):
+        await notify_vocabulary_changed()
+    print(json.dumps(stats))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,207 @@
+import asyncio
+from datetime import date, timedelta
+import logging
+
+from config import LEADERBOARD_SIZE, LEADERBOARD_MIN_WEEKLY_ANSWERS, LEADERBOARD_RECONCILE_INTERVAL
+from database import iter_learned_counts, iter_activity_totals, iter_streaks
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Reytinglar va kunlik seriyalar (streak) Redis'da saqlanadi va har bir test natijasida qisman yangilanadi:
+# /top va /streak faqat Redis'dan o'qiydi (ZREVRANGE/ZREVRANK - O(log n)), bazaga murojaat qilinmaydi.
+#   leaderboard:learned           - sorted set: foydalanuvchi ID -> o'rganilgan so'zlar soni
+#   leaderboard:accuracy:<hafta>  - sorted set: joriy ISO haftadagi to'g'ri javoblar foizi
+#                                   (kamida LEADERBOARD_MIN_WEEKLY_ANSWERS ta javob berganlar)
+#   weekly_answers:<hafta>        - hash: "<ID>:correct", "<ID>:total" - foiz shu hisoblagichlardan olinadi
+#   streak:<ID>                   - hash: current, best, last_day (date.toordinal())
+#   leaderboard:names             - hash: foydalanuvchi ID -> ko'rsatiladigan ism
+# Redis yozuvlari bazadagi yozuvdan keyin bajariladi va xato bo'lsa tashlab yuboriladi, shuning uchun
+# vaqti-vaqti bilan barcha qiymatlar bazadan (user_words, user_daily_activity) qayta quriladi.
+LEARNED_KEY = "leaderboard:learned"
+ACCURACY_KEY = "leaderboard:accuracy:{}"
+WEEKLY_ANSWERS_KEY = "weekly_answers:{}"
+STREAK_KEY = "streak:{}"
+NAMES_KEY = "leaderboard:names"
+# Qayta qurishni jarayonlardan faqat bittasi bajarishi uchun belgi
+RECONCILE_KEY = "leaderboard:reconciled"
+# Haftalik kalitlar o'tgan haftani ham ko'rsatish mumkin bo'lishi uchun 2 hafta saqlanadi
+WEEKLY_KEY_TTL = 14 * 24 * 3600
+RECONCILE_BATCH_SIZE = 1000
+
+# Haftalik hisoblagichlar, foiz reytingi va seriya bitta atomar skript bilan yangilanadi
+# KEYS: weekly_answers, leaderboard:accuracy, streak; ARGV: ID, to'g'ri, jami, minimal javoblar, kun, TTL
+_RECORD_ANSWERS_SCRIPT = """
+local correct = redis.call('HINCRBY', KEYS[1], ARGV[1] .. ':correct', ARGV[2])
+local total = redis.call('HINCRBY', KEYS[1], ARGV[1] .. ':total', ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[6])
+if total >= tonumber(ARGV[4]) then
+    redis.call('ZADD', KEYS[2], tostring(correct * 100 / total), ARGV[1])
+    redis.call('EXPIRE', KEYS[2], ARGV[6])
+end
+local day = tonumber(ARGV[5])
+local last_day = tonumber(redis.call('HGET', KEYS[3], 'last_day') or '0')
+if day > last_day then
+    local current = 1
+    if last_day == day - 1 then
+        current = tonumber(redis.call('HGET', KEYS[3], 'current') or '0') + 1
+    end
+    local best = math.max(current, tonumber(redis.call('HGET', KEYS[3], 'best') or '0'))
+    redis.call('HSET', KEYS[3], 'current', current, 'best', best, 'last_day', day)
+end
+return total
+"""
+
+
+def week_id(day: date) -> str:
+    """
+    ISO hafta identifikatori, masalan '2026-W42'.
+    """
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+async def record_answers(redis, user_id: int, correct: int, total: int, day: date = None):
+    """
+    Bazaga yozilgan test javoblarini haftalik foiz reytingi va kunlik seriyaga qo'shadi.
+    """
+    if not total:
+        return
+    day = day or date.today()
+    week = week_id(day)
+    try:
+        # register_script faqat SHA1 hisoblaydi: skript EVALSHA bilan, Redis'da bo'lmasa EVAL bilan bajariladi
+        await redis.register_script(_RECORD_ANSWERS_SCRIPT)(
+            keys=[WEEKLY_ANSWERS_KEY.format(week), ACCURACY_KEY.format(week), STREAK_KEY.format(user_id)],
+            args=[user_id, correct, total, LEADERBOARD_MIN_WEEKLY_ANSWERS, day.toordinal(), WEEKLY_KEY_TTL],
+        )
+    except Exception as e:
+        logger.warning(f"Foydalanuvchi {user_id} reytingi yangilanmadi (qayta qurishda tiklanadi): {e}")
+
+
+async def record_test_finished(redis, user_id: int, name: str, newly_learned: int):
+    """
+    Test yakunida foydalanuvchi ismini va yangi o'rganilgan so'zlar sonini reytingga yozadi.
+    """
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.hset(NAMES_KEY, user_id, name)
+            if newly_learned:
+                pipe.zincrby(LEARNED_KEY, newly_learned, user_id)
+            await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Foydalanuvchi {user_id} reytingi yangilanmadi (qayta qurishda tiklanadi): {e}")
+
+
+async def get_top(redis, user_id: int, limit: int = LEADERBOARD_SIZE, day: date = None) -> dict:
+    """
+    O'rganilgan so'zlar va haftalik foiz bo'yicha eng yaxshi limit ta foydalanuvchi hamda
+    so'ragan foydalanuvchining o'rni. Har bir reyting: {'top': [(ism, ball)], 'rank': o'rin yoki None, 'score': ball}.
+    """
+    keys = {'learned': LEARNED_KEY, 'accuracy': ACCURACY_KEY.format(week_id(day or date.today()))}
+    async with redis.pipeline(transaction=False) as pipe:
+        for key in keys.values():
+            pipe.zrevrange(key, 0, limit - 1, withscores=True)
+            pipe.zrevrank(key, user_id)
+            pipe.zscore(key, user_id)
+        results = await pipe.execute()
+
+    member_ids = {member for top in results[::3] for member, _ in top}
+    names = {}
+    if member_ids:
+        member_ids = list(member_ids)
+        names = dict(zip(member_ids, await redis.hmget(NAMES_KEY, member_ids)))
+
+    boards = {}
+    for i, board in enumerate(keys):
+        top, rank, score = results[i * 3:i * 3 + 3]
+        boards[board] = {
+            'top': [
+                ((names.get(member) or b"").decode() or f"#{member.decode()}", member_score)
+                for member, member_score in top
+            ],
+            'rank': rank + 1 if rank is not None else None,
+            'score': score,
+        }
+    return boards
+
+
+async def get_streak(redis, user_id: int, day: date = None) -> dict:
+    """
+    Foydalanuvchining joriy va eng uzun kunlik seriyasi.
+    Kecha ham, bugun ham test javobi bo'lmasa, joriy seriya uzilgan (0).
+    """
+    day = day or date.today()
+    current, best, last_day = await redis.hmget(STREAK_KEY.format(user_id), 'current', 'best', 'last_day')
+    current = int(current or 0)
+    if last_day is None or int(last_day) < day.toordinal() - 1:
+        current = 0
+    return {'current': current, 'best': int(best or 0), 'active_today': last_day is not None and int(last_day) == day.toordinal()}
+
+
+async def _replace_key(redis, key: str, rebuilt_key: str, ttl: int = None):
+    # Yangi qiymat alohida kalitda quriladi va RENAME bilan bir zumda almashtiriladi
+    async with redis.pipeline(transaction=True) as pipe:
+        if await redis.exists(rebuilt_key):
+            pipe.rename(rebuilt_key, key)
+            if ttl:
+                pipe.expire(key, ttl)
+        else:
+            pipe.delete(key)
+        await pipe.execute()
+
+
+async def reconcile(redis, day: date = None) -> dict:
+    """
+    Barcha reyting va seriyalarni bazadan qayta quradi.
+    Qayta qurish davomida yozilgan natijalar keyingi qayta qurishgacha hisobga olinmay qolishi mumkin.
+    """
+    day = day or date.today()
+    week = week_id(day)
+    stats = {'learned': 0, 'accuracy': 0, 'streaks': 0}
+
+    rebuilt_key = f"{LEARNED_KEY}:rebuild"
+    await redis.delete(rebuilt_key)
+    async for batch in iter_learned_counts(RECONCILE_BATCH_SIZE):
+        await redis.zadd(rebuilt_key, {user_id: learned for user_id, learned in batch})
+        stats['learned'] += len(batch)
+    await _replace_key(redis, LEARNED_KEY, rebuilt_key)
+
+    answers_key, accuracy_key = WEEKLY_ANSWERS_KEY.format(week), ACCURACY_KEY.format(week)
+    rebuilt_answers_key, rebuilt_accuracy_key = f"{answers_key}:rebuild", f"{accuracy_key}:rebuild"
+    await redis.delete(rebuilt_answers_key, rebuilt_accuracy_key)
+    week_start = day - timedelta(days=day.weekday())
+    async for batch in iter_activity_totals(week_start, RECONCILE_BATCH_SIZE):
+        async with redis.pipeline(transaction=False) as pipe:
+            for user_id, correct, total in batch:
+                pipe.hset(rebuilt_answers_key, mapping={f"{user_id}:correct": correct, f"{user_id}:total": total})
+                if total >= LEADERBOARD_MIN_WEEKLY_ANSWERS:
+                    pipe.zadd(rebuilt_accuracy_key, {user_id: correct * 100 / total})
+            await pipe.execute()
+        stats['accuracy'] += len(batch)
+    await _replace_key(redis, answers_key, rebuilt_answers_key, WEEKLY_KEY_TTL)
+    await _replace_key(redis, accuracy_key, rebuilt_accuracy_key, WEEKLY_KEY_TTL)
+
+    async for batch in iter_streaks(RECONCILE_BATCH_SIZE):
+        async with redis.pipeline(transaction=False) as pipe:
+            for user_id, current, best, last_day in batch:
+                pipe.hset(STREAK_KEY.format(user_id), mapping={'current': current, 'best': best, 'last_day': last_day.toordinal()})
+            await pipe.execute()
+        stats['streaks'] += len(batch)
+    return stats
+
+
+async def run_reconcile_worker(redis, interval: int = LEADERBOARD_RECONCILE_INTERVAL):
+    """
+    Reytinglarni muntazam qayta quradigan fon vazifasi.
+    Bir nechta jarayon bo'lsa, har interval soniyada faqat belgini birinchi qo'ygan jarayon quradi.
+    """
+    while True:
+        try:
+            if await redis.set(RECONCILE_KEY, 1, nx=True, ex=interval):
+                stats = await reconcile(redis)
+                logger.info(f"Reytinglar qayta qurildi: {stats['learned']} ta (so'zlar), "
+                            f"{stats['accuracy']} ta (haftalik), {stats['streaks']} ta seriya.")
+        except Exception as e:
+            logger.error(f"Reytinglarni qayta qurishda xato: {e}")
+        await asyncio.sleep(interval)
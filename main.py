@@ -1,42 +1,86 @@
 import logging
 import asyncio
 from datetime import datetime, timedelta
-import random
+import multiprocessing
 import os
+import signal
+import sys
+import time
 # Webhook uchun yangi importlar
 from aiohttp import web # HTTP server yaratish uchun
 from aiogram.types import Update # Telegramdan keladigan update turi
 from aiogram import Bot, Dispatcher, types, F
 from aiogram.enums import ParseMode
-from aiogram.fsm.storage.redis import RedisStorage, Redis
+from aiogram.fsm.storage.redis import RedisStorage, RedisEventIsolation
 from aiogram.fsm.context import FSMContext
 from aiogram.filters import CommandStart, Command
 from aiogram.utils.markdown import hbold
 from aiogram.client.default import DefaultBotProperties
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from config import BOT_TOKEN, REDIS_URL, WORDS_PER_DAY, PASS_PERCENTAGE, TEST_OPTIONS_COUNT
-from aiogram.fsm.state import StatesGroup
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from config import (
+    BOT_TOKEN, REDIS_URL, WORDS_PER_DAY, PASS_PERCENTAGE, TELEGRAM_API_URL, WEB_WORKERS, LEADERBOARD_MIN_WEEKLY_ANSWERS,
+    SHUTDOWN_TIMEOUT, METRICS_PORT
+)
+from aiogram.fsm.state import State, StatesGroup
 from database import (
     init_db_pool, close_db_pool, create_tables, add_sample_words,
     get_or_create_user, get_words_for_user, get_user_test_words,
-    get_random_words_for_options, update_user_word_progress,
-    calculate_test_result, update_user_last_test_date, get_total_words_count
+    calculate_test_result, update_user_last_test_date, get_total_words_count,
+    load_vocabulary_cache, get_pool_stats, get_user_stats, cache_missing_words
+)
+from pronunciation import send_word_pronunciation
+from answer_buffer import decode_answers, flush_answers, run_pending_flush_worker
+from test_plan import build_test_plan, describe_question, question_word_ids, DIRECTION_ENGLISH
+from test_sessions import (
+    create_test_session, get_test_plan, delete_test_session, set_current_question, is_stale_answer,
+    record_answer, get_answers
 )
-from tts_service import generate_audio, delete_audio_file
+from send_scheduler import send_scheduler
+from reminders import run_reminder_worker
+import leaderboards
+from cluster import is_duplicate_update, forget_update, run_as_leader
+from migrations import LATEST_VERSION
+from update_queue import start_workers, enqueue_update, stop_workers, queue_depth
+from metrics import InstrumentedRedis, handler_metrics_middleware, metrics_handler, create_metrics_app
+import metrics
+import db_profiler
+from callback_tokens import TOKEN_PREFIX, encode_answer_token, decode_answer_token
+import vocab_cache
 
 # Loglash sozlamalari
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Redis ulanishi
-redis = Redis.from_url(REDIS_URL)
+redis = InstrumentedRedis.from_url(REDIS_URL) # buyruqlar vaqti /metrics da ko'rinadi
 # Aiogram FSM storage
 storage = RedisStorage(redis=redis)
 
 # Bot va Dispatcher obyektlari
 
-dp = Dispatcher(storage=storage)
-bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+# Bir foydalanuvchining update'lari barcha jarayonlarda Redis qulfi orqali ketma-ket qayta ishlanadi (FSM holati buzilmasligi uchun)
+dp = Dispatcher(storage=storage, events_isolation=RedisEventIsolation(redis))
+# Handlerlar bajarilish vaqti /metrics uchun yoziladi
+dp.message.middleware(handler_metrics_middleware)
+dp.callback_query.middleware(handler_metrics_middleware)
+bot = Bot(
+    token=BOT_TOKEN,
+    session=AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL)) if TELEGRAM_API_URL else None,
+    default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+)
+# Barcha chiquvchi so'rovlar limitlar bo'yicha navbatga qo'yiladi
+bot.session.middleware(send_scheduler)
+
+# /metrics so'ralganda hisoblanadigan ko'rsatkichlar
+metrics.register_gauge('db_pool_connections', "Ma'lumotlar bazasi ulanish puli (state: size, in_use, max)",
+                       lambda: {(('state', state),): value for state, value in get_pool_stats().items()})
+metrics.register_gauge('webhook_queue_depth', "Qayta ishlanishini kutayotgan update'lar soni", queue_depth)
+metrics.register_gauge('telegram_send_queue_depth', "Telegram limitini kutayotgan so'rovlar soni", send_scheduler.queue_depth)
+metrics.register_gauge('telegram_send_requests', "Telegramga yuborilgan so'rovlar (result: sent, retries, failed)",
+                       lambda: {(('result', result),): send_scheduler.metrics[result] for result in ('sent', 'retries', 'failed')})
+
 # Foydalanuvchi holatlari (FSM)
 class UserState(StatesGroup):
     """
@@ -55,13 +99,15 @@ async def command_start_handler(message: types.Message, state: FSMContext) -> No
     """
     telegram_id = message.from_user.id
     user = await get_or_create_user(telegram_id)
-    await state.update_data(db_user_id=user['id'])
+    user_data = await state.update_data(db_user_id=user['id'])
+    await flush_abandoned_test(state, user_data)
 
     await message.answer(
         f"Salom, {hbold(message.from_user.full_name)}! Til o'rganish botiga xush kelibsiz!\n\n"
         "Men sizga har kuni yangi inglizcha so'zlarni o'zbekcha tarjimasi bilan beraman. "
         "Ertasi kuni esa o'rgangan so'zlaringizni test qilaman.\n\n"
-        "So'zlar olishni boshlash uchun /words buyrug'ini bosing."
+        "So'zlar olishni boshlash uchun /words buyrug'ini bosing.\n"
+        "Reytinglar: /top, kunlik seriyangiz: /streak, natijalaringiz: /stats."
     )
     await state.set_state(UserState.waiting_for_word_request)
 
@@ -78,30 +124,26 @@ async def get_daily_words_handler(message: types.Message, state: FSMContext) ->
         # Agar foydalanuvchi /start ni bosmagan bo'lsa
         await message.answer("Iltimos, avval /start buyrug'ini bosing.")
         return
+    await flush_abandoned_test(state, user_data)
 
     user = await get_or_create_user(message.from_user.id) # Foydalanuvchi ma'lumotlarini yangilash
     last_word_fetch_date = user['last_word_fetch_date']
-    last_test_date = user['last_test_date']
 
     now = datetime.now()
     # So'zlar berish uchun 24 soat o'tgan bo'lishi kerak
     can_get_new_words = (last_word_fetch_date is None or
                          (now - last_word_fetch_date) > timedelta(hours=23)) # 23 soat qilib qo'ydim, biroz ertaroq testga tayyor bo'lishi uchun
 
-    # Testga tayyor bo'lish uchun 24 soat o'tgan bo'lishi kerak
-    is_test_due = (last_word_fetch_date is not None and
-                   (now - last_word_fetch_date) > timedelta(hours=24) and
-                   (last_test_date is None or (now - last_test_date) > timedelta(hours=23))) # Testdan keyin ham 23 soat kutish
+    # Takrorlash vaqti kelgan so'zlar (user_words.due_at): yangi so'zlar ertasiga, keyin esa
+    # javoblarga qarab o'sib boruvchi oraliqlarda. Bunday so'zlar bo'lsa, avval test.
+    # users.next_due_at (keshdagi foydalanuvchi bilan) eng yaqin muddat, shuning uchun baza faqat u kelganda so'raladi.
+    next_due_at = user['next_due_at']
+    test_words = await get_user_test_words(db_user_id) if next_due_at is not None and next_due_at <= now else []
 
-    if is_test_due:
+    if test_words:
         # Test vaqti kelgan
-        test_words = await get_user_test_words(db_user_id)
-        if test_words:
-            await message.answer("Sizning kechagi so'zlaringiz bo'yicha test vaqti keldi!")
-            await start_test(message, state, test_words)
-        else:
-            await message.answer("Kechagi so'zlaringiz bo'yicha test topilmadi yoki barcha so'zlar o'rganilgan. Yangi so'zlar olishingiz mumkin.")
-            await give_new_words(message, state, db_user_id)
+        await message.answer("Sizning so'zlaringiz bo'yicha test vaqti keldi!")
+        await start_test(message, state, test_words)
     elif can_get_new_words:
         # Yangi so'zlar olish vaqti kelgan
         await give_new_words(message, state, db_user_id)
@@ -138,89 +180,97 @@ async def give_new_words(message: types.Message, state: FSMContext, db_user_id:
 async def start_test(message: types.Message, state: FSMContext, test_words: list):
     """
     Testni boshlaydi.
+    Barcha savollar test rejasi sifatida oldindan tayyorlanadi va test sessiyasi sifatida saqlanadi.
     """
-    await state.update_data(test_words=test_words, current_question_index=0, correct_answers_count=0)
+    if not vocab_cache.is_loaded:
+        await load_vocabulary_cache()
+    await cache_missing_words([word['id'] for word in test_words])
+    test_plan = build_test_plan(test_words)
+    # Reja va javoblar alohida Redis kalitlarida saqlanadi, FSM holatida faqat sessiya ID'si qoladi
+    test_session = await create_test_session(redis, test_plan)
     await state.set_state(UserState.in_test)
-    await send_next_test_question(message, state)
+    await state.update_data(test_session=test_session)
+    await send_next_test_question(message, state, test_session, 0, test_plan)
 
-async def send_next_test_question(message: types.Message, state: FSMContext):
+async def send_next_test_question(message: types.Message, state: FSMContext, test_session: str,
+                                  current_question_index: int, test_plan: list):
     """
     Navbatdagi test savolini yuboradi.
+    Savol test rejasidan olinadi, shuning uchun bazaga murojaat qilinmaydi.
     """
-    user_data = await state.get_data()
-    test_words = user_data.get('test_words')
-    current_question_index = user_data.get('current_question_index')
-
-    if current_question_index >= len(test_words):
+    if current_question_index >= len(test_plan):
         # Test tugadi
-        await finish_test(message, state)
+        await finish_test(message, state, test_session, test_plan)
         return
 
-    word_to_test = test_words[current_question_index]
-    correct_word_id = word_to_test['id']
-    english_word = word_to_test['english_word']
-    uzbek_word = word_to_test['uzbek_word']
-
-    # Savol turi: Inglizcha yoki O'zbekcha
-    is_english_question = random.choice([True, False])
+    question = test_plan[current_question_index]
+    description = await describe_test_question(question)
+    if description is None:
+        await abort_test(message, state, test_session)
+        return
+    asked_word, correct_answer, options, correct_option_index = description
+    is_english_question = question[1] == DIRECTION_ENGLISH
 
     if is_english_question:
-        question_text = f"<b>'{english_word}'</b> so'zining o'zbekcha tarjimasini toping:"
-        correct_answer = uzbek_word
-        # Noto'g'ri variantlar uchun so'zlarni olish
-        wrong_options_db = await get_random_words_for_options(correct_word_id, TEST_OPTIONS_COUNT - 1)
-        wrong_options = [w['uzbek_word'] for w in wrong_options_db]
+        question_text = f"<b>'{asked_word}'</b> so'zining o'zbekcha tarjimasini toping:"
     else:
-        question_text = f"<b>'{uzbek_word}'</b> so'zining inglizcha tarjimasini toping:"
-        correct_answer = english_word
-        # Noto'g'ri variantlar uchun so'zlarni olish
-        wrong_options_db = await get_random_words_for_options(correct_word_id, TEST_OPTIONS_COUNT - 1)
-        wrong_options = [w['english_word'] for w in wrong_options_db]
-
-    options = [correct_answer] + wrong_options
-    random.shuffle(options)
+        question_text = f"<b>'{asked_word}'</b> so'zining inglizcha tarjimasini toping:"
 
     builder = InlineKeyboardBuilder()
-    for option in options:
-        builder.button(text=option, callback_data=f"test_answer_{correct_word_id}_{option}_{correct_answer}")
+    for option_index, option in enumerate(options):
+        builder.button(text=option, callback_data=encode_answer_token(message.chat.id, test_session, current_question_index, option_index))
     builder.adjust(1) # Har bir tugma alohida qatorda
 
+    set_current_question(test_session, current_question_index)
     await message.answer(question_text, reply_markup=builder.as_markup(), parse_mode=ParseMode.HTML)
 
     # Talaffuzni yuborish (agar inglizcha savol bo'lsa)
-    if is_english_question and english_word:
-        audio_path = await generate_audio(english_word, lang='en')
-        if audio_path:
-            with open(audio_path, 'rb') as audio_file:
-                await bot.send_audio(message.chat.id, types.BufferedInputFile(audio_file.read(), filename=os.path.basename(audio_path)))
-            await delete_audio_file(audio_path) # Faylni o'chirish
+    if is_english_question and asked_word:
+        await send_word_pronunciation(bot, redis, message.chat.id, question[0], asked_word)
 
 
-@dp.callback_query(UserState.in_test, F.data.startswith("test_answer_"))
+@dp.callback_query(F.data.startswith(TOKEN_PREFIX))
 async def process_test_answer_callback(callback_query: types.CallbackQuery, state: FSMContext):
     """
     Test javobini qayta ishlaydi.
+    Javob imzolangan tugma ma'lumotlari va test rejasi bo'yicha baholanadi va sessiyaga atomar yoziladi
+    (record_answer): FSM holati o'qilmaydi. Javob qabul qilinmasa (eski yoki takroriy bosish),
+    xabar tahrirlanmaydi va savol ko'rsatkichi siljitilmaydi.
     """
-    await callback_query.answer() # Callback so'rovini yopish
-
-    data_parts = callback_query.data.split('_')
-    # Format: test_answer_{word_id}_{selected_answer}_{correct_answer}
-    word_id = int(data_parts[2])
-    selected_answer = data_parts[3]
-    correct_answer = data_parts[4]
+    token = decode_answer_token(callback_query.message.chat.id, callback_query.data)
+    if token is None:
+        await callback_query.answer("Bu tugma eskirgan.")
+        return
+    test_session, question_index, option_index = token
+    if is_stale_answer(test_session, question_index):
+        # Oldingi savol tugmasi qayta bosilgan
+        await callback_query.answer()
+        return
 
-    user_data = await state.get_data()
-    db_user_id = user_data.get('db_user_id')
-    current_question_index = user_data.get('current_question_index')
-    correct_answers_count = user_data.get('correct_answers_count')
+    test_plan = await get_test_plan(redis, test_session)
+    if test_plan is None or question_index >= len(test_plan):
+        await callback_query.answer("Bu test yakunlangan.")
+        return
+    await callback_query.answer() # Callback so'rovini yopish
 
-    is_correct = (selected_answer == correct_answer)
+    question = test_plan[question_index]
+    description = await describe_test_question(question)
+    if description is None:
+        await abort_test(callback_query.message, state, test_session)
+        return
+    _, correct_answer, options, correct_option_index = description
+    if option_index >= len(options):
+        return
+    selected_answer = options[option_index]
+    is_correct = (option_index == correct_option_index)
 
-    # Foydalanuvchi progressini yangilash
-    await update_user_word_progress(db_user_id, word_id, is_correct)
+    # Javob bazaga darhol yozilmaydi, test oxirigacha sessiyaning Redis kalitida yig'iladi
+    if not await record_answer(redis, test_session, question_index, is_correct):
+        # Boshqa jarayonda allaqachon qayta ishlangan yoki yakunlangan testning tugmasi
+        return
+    set_current_question(test_session, question_index + 1)
 
     if is_correct:
-        correct_answers_count += 1
         await callback_query.message.edit_text(
             f"✅ To'g'ri javob! Siz <b>'{selected_answer}'</b> ni tanladingiz.",
             parse_mode=ParseMode.HTML
@@ -231,29 +281,82 @@ async def process_test_answer_callback(callback_query: types.CallbackQuery, stat
             parse_mode=ParseMode.HTML
         )
 
-    # Keyingi savolga o'tish
-    current_question_index += 1
-    await state.update_data(current_question_index=current_question_index, correct_answers_count=correct_answers_count)
-
     await asyncio.sleep(1) # Foydalanuvchiga javobni ko'rishga imkon berish
-    await send_next_test_question(callback_query.message, state)
+    await send_next_test_question(callback_query.message, state, test_session, question_index + 1, test_plan)
+
 
+async def describe_test_question(question: list):
+    """
+    describe_question: lug'at keshida yo'q so'zlar avval bazadan o'qiladi.
+    So'z bazadan ham o'chirilgan bo'lsa None qaytaradi.
+    """
+    description = describe_question(question)
+    if description is None:
+        await cache_missing_words(question_word_ids(question))
+        description = describe_question(question)
+    return description
+
+
+async def abort_test(message: types.Message, state: FSMContext, test_session: str):
+    """
+    Savol so'zlari lug'atdan o'chirilgan testni to'xtatadi: berilgan javoblar saqlanadi, sessiya yopiladi.
+    """
+    user_data = await state.get_data()
+    if user_data.get('test_session') != test_session:
+        return
+    logger.warning(f"Test {test_session} so'zlari lug'atda topilmadi, test to'xtatildi.")
+    await flush_abandoned_test(state, user_data)
+    await state.set_state(UserState.waiting_for_word_request)
+    await message.answer("Test so'zlari lug'atda o'zgargani uchun test to'xtatildi. Davom etish uchun /words buyrug'ini bosing.")
 
-async def finish_test(message: types.Message, state: FSMContext):
+
+async def flush_abandoned_test(state: FSMContext, user_data: dict):
+    """
+    Yakunlanmay qolgan testning buferdagi javoblarini bazaga yozadi va sessiyani yopadi.
+    """
+    test_session = user_data.get('test_session')
+    if not test_session:
+        return
+    test_plan = await get_test_plan(redis, test_session)
+    if test_plan is None:
+        # Reja va javoblar bir xil muddat saqlanadi (har bir javobda yangilanadi): test TEST_SESSION_TTL dan
+        # ko'proq tashlab qo'yilgan, javoblar bazaga yozilmaydi
+        answered = user_data.get('current_question_index') or 0
+        logger.warning(f"Foydalanuvchi {user_data.get('db_user_id')} testi ({test_session}) muddati o'tgan, "
+                       f"javoblari bazaga yozilmadi{f' ({answered} ta)' if answered else ''}.")
+    else:
+        outcomes = await get_answers(redis, test_session)
+        if not outcomes and user_data.get('current_question_index'):
+            # Javoblari FSM holatida bitmaska ko'rinishida saqlangan (oldingi versiyada boshlangan) test
+            outcomes = decode_answers(user_data.get('test_answers', 0), user_data['current_question_index'])
+        await flush_answers(redis, user_data.get('db_user_id'), test_plan, outcomes)
+    await delete_test_session(redis, test_session)
+    await state.update_data(test_session=None, test_answers=None, current_question_index=None, correct_answers_count=None)
+
+
+async def finish_test(message: types.Message, state: FSMContext, test_session: str, test_plan: list):
     """
     Testni yakunlaydi, natijalarni hisoblaydi va foydalanuvchiga xabar beradi.
     """
     user_data = await state.get_data()
+    if user_data.get('test_session') != test_session:
+        # Test boshqa so'rov tomonidan yopilgan (javoblari o'sha yerda yozilgan)
+        return
     db_user_id = user_data.get('db_user_id')
-    test_words = user_data.get('test_words')
-    correct_answers_count = user_data.get('correct_answers_count')
+    outcomes = await get_answers(redis, test_session)
 
     # Testdagi so'zlar ID'lari ro'yxati
-    word_ids_in_test = [word['id'] for word in test_words]
+    word_ids_in_test = [question[0] for question in test_plan]
+
+    # Test davomida yig'ilgan javoblarni bitta so'rov bilan bazaga yozish
+    await flush_answers(redis, db_user_id, test_plan, outcomes)
+    await delete_test_session(redis, test_session)
+    await state.update_data(test_session=None)
 
     # Test natijasini hisoblash va bazani yangilash
-    percentage = await calculate_test_result(db_user_id, word_ids_in_test)
+    percentage, newly_learned = await calculate_test_result(db_user_id, word_ids_in_test, sum(outcomes))
     await update_user_last_test_date(db_user_id) # Oxirgi test sanasini yangilash
+    await leaderboards.record_test_finished(redis, db_user_id, message.chat.full_name, newly_learned)
 
     if percentage >= PASS_PERCENTAGE:
         await message.answer(
@@ -272,6 +375,72 @@ async def finish_test(message: types.Message, state: FSMContext):
         )
     await state.set_state(UserState.waiting_for_word_request) # Holatni tiklash
 
+@dp.message(Command("top"))
+async def top_handler(message: types.Message, state: FSMContext) -> None:
+    """
+    /top komandasiga javob beradi: o'rganilgan so'zlar va haftalik natija bo'yicha reytinglar.
+    Reytinglar faqat Redis'dan o'qiladi.
+    """
+    db_user_id = (await state.get_data()).get('db_user_id')
+    if db_user_id is None:
+        await message.answer("Iltimos, avval /start buyrug'ini bosing.")
+        return
+    boards = await leaderboards.get_top(redis, db_user_id)
+
+    text = "🏆 <b>O'rganilgan so'zlar bo'yicha:</b>\n"
+    for place, (name, score) in enumerate(boards['learned']['top'], start=1):
+        text += f"{place}. {hbold(name)} - {int(score)} ta so'z\n"
+    if boards['learned']['rank']:
+        text += f"Siz: {boards['learned']['rank']}-o'rin ({int(boards['learned']['score'])} ta so'z)\n"
+
+    text += "\n📈 <b>Shu haftadagi to'g'ri javoblar foizi bo'yicha:</b>\n"
+    if not boards['accuracy']['top']:
+        text += f"Hali hech kim {LEADERBOARD_MIN_WEEKLY_ANSWERS} ta javobga yetmadi.\n"
+    for place, (name, score) in enumerate(boards['accuracy']['top'], start=1):
+        text += f"{place}. {hbold(name)} - {score:.1f}%\n"
+    if boards['accuracy']['rank']:
+        text += f"Siz: {boards['accuracy']['rank']}-o'rin ({boards['accuracy']['score']:.1f}%)\n"
+    await message.answer(text, parse_mode=ParseMode.HTML)
+
+@dp.message(Command("streak"))
+async def streak_handler(message: types.Message, state: FSMContext) -> None:
+    """
+    /streak komandasiga javob beradi: ketma-ket test ishlangan kunlar soni.
+    """
+    db_user_id = (await state.get_data()).get('db_user_id')
+    if db_user_id is None:
+        await message.answer("Iltimos, avval /start buyrug'ini bosing.")
+        return
+    streak = await leaderboards.get_streak(redis, db_user_id)
+    text = f"🔥 Joriy seriya: <b>{streak['current']}</b> kun\nEng uzun seriya: <b>{streak['best']}</b> kun"
+    if not streak['active_today']:
+        text += "\n\nBugun hali test ishlamadingiz - seriyani davom ettirish uchun /words buyrug'ini bosing."
+    await message.answer(text, parse_mode=ParseMode.HTML)
+
+@dp.message(Command("stats"))
+async def stats_handler(message: types.Message, state: FSMContext) -> None:
+    """
+    /stats komandasiga javob beradi: o'rganilgan so'zlar, to'g'ri javoblar foizi va testlar soni.
+    """
+    db_user_id = (await state.get_data()).get('db_user_id')
+    if db_user_id is None:
+        db_user_id = (await get_or_create_user(message.from_user.id))['id']
+    stats = await get_user_stats(db_user_id)
+    if stats is None or not (stats['total_attempts'] or stats['learned_count']):
+        await message.answer("Hali natijalaringiz yo'q. So'zlar olish uchun /words buyrug'ini bosing.")
+        return
+
+    accuracy = stats['correct_attempts'] / stats['total_attempts'] * 100 if stats['total_attempts'] else 0
+    text = (
+        f"📊 <b>Sizning natijalaringiz</b>\n\n"
+        f"O'rganilgan so'zlar: <b>{stats['learned_count']}</b>\n"
+        f"To'g'ri javoblar: <b>{stats['correct_attempts']}</b> / {stats['total_attempts']} ({accuracy:.1f}%)\n"
+        f"Testlar: <b>{stats['tests_passed']}</b> ta o'tildi, {stats['tests_failed']} ta o'tilmadi\n"
+    )
+    if stats['last_activity_at']:
+        text += f"Oxirgi faollik: {stats['last_activity_at']:%Y-%m-%d %H:%M}"
+    await message.answer(text, parse_mode=ParseMode.HTML)
+
 @dp.message()
 async def echo_handler(message: types.Message, state: FSMContext) -> None:
     """
@@ -299,6 +468,15 @@ async def main() -> None:
     if words_count < WORDS_PER_DAY * 2: # Kamida 2 kunlik so'z bo'lishi kerak
         logger.info("Lug'atda yetarli so'zlar yo'q, namunaviy so'zlar qo'shilmoqda...")
         await add_sample_words()
+    await load_vocabulary_cache() # Lug'at keshini xotiraga yuklash
+    asyncio.create_task(run_pending_flush_worker(redis)) # Bazaga yozilmay qolgan javoblarni qayta yozish
+    asyncio.create_task(vocab_cache.run_refresh_worker(redis, load_vocabulary_cache)) # Import qilingan so'zlarni keshga olish
+    asyncio.create_task(run_reminder_worker(bot)) # Test vaqti kelganlarga eslatma yuborish
+    asyncio.create_task(leaderboards.run_reconcile_worker(redis)) # Reytinglarni bazadan qayta qurish
+
+    # SIGUSR1 signali bilan SQL profil xulosasini logga chiqarish (kill -USR1 <pid>)
+    if hasattr(signal, 'SIGUSR1'):
+        asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, db_profiler.log_summary)
 
     # Botni polling rejimida ishga tushirish
     try:
@@ -314,48 +492,111 @@ async def on_startup(dispatcher: Dispatcher, bot_obj: Bot, webhook_url: str):
     """
     logger.info("Bot ishga tushirilmoqda (Webhook)...")
     await init_db_pool() # Ma'lumotlar bazasi ulanishini ishga tushirish
-    await create_tables() # Jadvallarni yaratish (agar mavjud bo'lmasa)
 
-    # Agar lug'atda so'zlar bo'lmasa, namunaviy so'zlarni qo'shish
-    words_count = await get_total_words_count()
-    if words_count < WORDS_PER_DAY * 2:
-        logger.info("Lug'atda yetarli so'zlar yo'q, namunaviy so'zlar qo'shilmoqda...")
-        await add_sample_words()
-
-    await bot_obj.set_webhook(webhook_url)
-    logger.info(f"Webhook o'rnatildi: {webhook_url}")
+    async def prepare_database():
+        await create_tables() # Jadvallarni yaratish (agar mavjud bo'lmasa)
+        # Agar lug'atda so'zlar bo'lmasa, namunaviy so'zlarni qo'shish
+        words_count = await get_total_words_count()
+        if words_count < WORDS_PER_DAY * 2:
+            logger.info("Lug'atda yetarli so'zlar yo'q, namunaviy so'zlar qo'shilmoqda...")
+            await add_sample_words()
+        await bot_obj.set_webhook(webhook_url)
+        logger.info(f"Webhook o'rnatildi: {webhook_url}")
+
+    # Bir nechta jarayon ishga tushganda bazani tayyorlash va webhookni o'rnatishni faqat bittasi bajaradi
+    await run_as_leader(redis, f"startup:v{LATEST_VERSION}", prepare_database)
+    await load_vocabulary_cache() # Lug'at keshini xotiraga yuklash
+    asyncio.create_task(run_pending_flush_worker(redis)) # Bazaga yozilmay qolgan javoblarni qayta yozish
+    asyncio.create_task(vocab_cache.run_refresh_worker(redis, load_vocabulary_cache)) # Import qilingan so'zlarni keshga olish
+    asyncio.create_task(run_reminder_worker(bot_obj)) # Test vaqti kelganlarga eslatma yuborish
+    asyncio.create_task(leaderboards.run_reconcile_worker(redis)) # Reytinglarni bazadan qayta qurish
 
 async def on_shutdown(dispatcher: Dispatcher, bot_obj: Bot):
     """
-    Bot to'xtaganda bajariladigan funksiya.
-    Webhookni o'chiradi va DB ulanishini yopadi.
+    Bot to'xtaganda bajariladigan funksiya: DB ulanishini va Redis'ni yopadi.
+    Webhook o'chirilmaydi: deploy paytida eski nusxa SIGTERM olganda yangi nusxa webhookni allaqachon
+    o'rnatgan bo'ladi. Webhookni o'chirish kerak bo'lsa: python main.py delete-webhook
     """
     logger.info("Bot to'xtatilmoqda (Webhook)...")
-    await bot_obj.delete_webhook()
     await close_db_pool()
     await redis.close()
-    logger.info("Webhook o'chirildi va resurslar yopildi.")
+    logger.info("Resurslar yopildi.")
+
+
+async def delete_webhook():
+    """
+    Webhookni qo'lda o'chirish (masalan, botni polling rejimiga o'tkazish yoki butunlay to'xtatish uchun).
+    """
+    try:
+        await bot.delete_webhook()
+        logger.info("Webhook o'chirildi.")
+    finally:
+        await bot.session.close()
 
 async def webhook_handler(request: web.Request):
     """
     Telegramdan kelgan Webhook so'rovlarini qayta ishlaydi.
+    Update tekshirilib navbatga qo'yiladi va javob darhol qaytariladi,
+    handlerlar esa fon ishchilarida bajariladi.
     """
     if request.match_info.get('token') == BOT_TOKEN:
-        update = Update.model_validate(await request.json(), context={"bot": bot})
-        await dp.feed_update(bot, update)
+        started_at = time.perf_counter()
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": bot})
+        except ValueError as e:
+            logger.warning(f"Noto'g'ri update keldi: {e}")
+            raise web.HTTPBadRequest()
+        if await is_duplicate_update(redis, update.update_id):
+            # Telegram qayta yuborgan va allaqachon qabul qilingan update
+            return web.Response()
+        if not await enqueue_update(update):
+            await forget_update(redis, update.update_id)
+            # Navbat to'lgan - Telegram update'ni keyinroq qayta yuboradi
+            raise web.HTTPServiceUnavailable(headers={"Retry-After": "1"})
+        metrics.observe('webhook_request_duration_seconds', time.perf_counter() - started_at)
         return web.Response()
     else:
         raise web.HTTPUnauthorized()
 
-async def main_webhook():
+# Har xil botlar uchun noyob yo'l; tokenni webhook_handler request.match_info['token'] orqali tekshiradi
+WEBHOOK_ROUTE = '/webhook/{token}'
+WEBHOOK_PATH = f'/webhook/{BOT_TOKEN}'
+
+def create_app(webhook_url: str) -> web.Application:
+    """
+    Webhook va /metrics yo'llari bilan aiohttp ilovasini yaratadi.
+    Ilova ishga tushganda bot startup funksiyalari va update ishchilari ishga tushadi,
+    to'xtaganda esa navbat bo'shatiladi va shutdown funksiyalari chaqiriladi.
+    """
+    # Botni ishga tushganda va to'xtaganda chaqiriladigan funksiyalarni ro'yxatdan o'tkazish
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
+
+    async def start_bot(app: web.Application):
+        # Startup funksiyalarini ishga tushirish (DB puli, jadvallar, lug'at keshi, webhook)
+        await dp.emit_startup(dispatcher=dp, bot_obj=bot, webhook_url=webhook_url)
+        start_workers(dp, bot) # Update'larni qayta ishlovchi ishchilar
+
+    async def stop_bot(app: web.Application):
+        await stop_workers()
+        await dp.emit_shutdown(dispatcher=dp, bot_obj=bot)
+
+    app = web.Application()
+    app.router.add_post(WEBHOOK_ROUTE, webhook_handler)
+    app.router.add_get('/metrics', metrics_handler) # Prometheus ko'rsatkichlari
+    app.on_startup.append(start_bot)
+    app.on_cleanup.append(stop_bot)
+    return app
+
+async def main_webhook(worker_index: int = 0):
     """
     Webhook rejimida botni ishga tushirish uchun asosiy funksiya.
+    worker_index - bir nechta jarayon rejimida jarayon tartib raqami (ko'rsatkichlar porti shundan olinadi).
     """
     # Render.com tomonidan berilgan PORT va URL'ni olish
     # Render avtomatik ravishda $PORT ni beradi
     WEB_SERVER_HOST = '0.0.0.0'
     WEB_SERVER_PORT = os.getenv("PORT") # Render tomonidan beriladi
-    WEBHOOK_PATH = f'/webhook/{BOT_TOKEN}' # Har xil botlar uchun noyob yo'l
     WEBHOOK_URL = os.getenv("WEBHOOK_URL") # Render.com domen nomini beradi
 
     if not WEBHOOK_URL:
@@ -365,29 +606,97 @@ async def main_webhook():
 
     WEBHOOK_URL = f"https://{WEBHOOK_URL}{WEBHOOK_PATH}" if "https" not in WEBHOOK_URL else f"{WEBHOOK_URL}{WEBHOOK_PATH}"
 
-    # Botni ishga tushganda va to'xtaganda chaqiriladigan funksiyalarni ro'yxatdan o'tkazish
-    dp.startup.register(lambda: on_startup(dp, bot, WEBHOOK_URL))
-    dp.shutdown.register(lambda: on_shutdown(dp, bot))
+    app = create_app(WEBHOOK_URL)
 
-    app = web.Application()
-    app.router.add_post(WEBHOOK_PATH, webhook_handler)
+    loop = asyncio.get_running_loop()
+    # SIGUSR1 signali bilan SQL profil xulosasini logga chiqarish (kill -USR1 <pid>)
+    if hasattr(signal, 'SIGUSR1'):
+        loop.add_signal_handler(signal.SIGUSR1, db_profiler.log_summary)
+    # SIGTERM (deploy, qayta ishga tushirish) va SIGINT da jarayon darhol o'ldirilmaydi, balki tartib bilan to'xtaydi
+    stop_event = asyncio.Event()
+    for stop_signal in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(stop_signal, stop_event.set)
 
-    # Webhook serverini ishga tushirish
+    # Webhook serverini ishga tushirish (ilova startup'i shu yerda bajariladi)
     runner = web.AppRunner(app)
     await runner.setup()
-    site = web.TCPSite(runner, WEB_SERVER_HOST, WEB_SERVER_PORT)
+    # Bir nechta jarayon bitta portni SO_REUSEPORT orqali bo'lishadi, ulanishlarni yadro taqsimlaydi
+    site = web.TCPSite(runner, WEB_SERVER_HOST, WEB_SERVER_PORT, reuse_port=WEB_WORKERS > 1)
     await site.start()
     logger.info(f"Webhook server {WEB_SERVER_HOST}:{WEB_SERVER_PORT} da ishga tushdi.")
 
-    # Server doimiy ishlashi uchun cheksiz tsikl
-    await asyncio.Event().wait()
+    # Bir nechta jarayon rejimida har bir jarayonning ko'rsatkichlari o'z portida
+    metrics_runner = None
+    if WEB_WORKERS > 1 and METRICS_PORT:
+        metrics_runner = web.AppRunner(create_metrics_app())
+        await metrics_runner.setup()
+        await web.TCPSite(metrics_runner, WEB_SERVER_HOST, METRICS_PORT + worker_index).start()
+        logger.info(f"Ko'rsatkichlar {WEB_SERVER_HOST}:{METRICS_PORT + worker_index}/metrics da.")
 
+    # To'xtash signalini kutish
+    try:
+        await stop_event.wait()
+        logger.info("To'xtash signali olindi, navbatdagi update'lar qayta ishlanmoqda...")
+    finally:
+        # Tartib: avval yangi so'rovlar qabul qilinmaydi (200 olgan update'lar navbatda qoladi),
+        # so'ng runner.cleanup -> stop_bot: navbatlar bo'shatiladi (stop_workers) va emit_shutdown chaqiriladi
+        await site.stop()
+        await runner.cleanup()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
 
-if __name__ == "__main__":
+
+def run_webhook(worker_index: int = 0):
     try:
-        asyncio.run(main_webhook()) # Asosiy funksiyani o'zgartirdik
+        asyncio.run(main_webhook(worker_index)) # Asosiy funksiyani o'zgartirdik
+        logger.info("Bot to'xtatildi.")
     except KeyboardInterrupt:
         logger.info("Bot qo'lda to'xtatildi.")
     except Exception as e:
         logger.error(f"Bot ishga tushirishda kutilmagan xato: {e}")
 
+
+def run_webhook_workers(workers: int):
+    """
+    Webhook serverini bir nechta jarayonda ishga tushiradi (har biri o'z event loop'i va ulanishlari bilan).
+    SIGTERM/SIGINT olinganda har bir jarayonga SIGTERM yuboriladi (ular navbatlarini bo'shatib to'xtaydi) va
+    ular kutiladi; SHUTDOWN_TIMEOUT dan keyin ham to'xtamaganlari majburan o'chiriladi.
+    """
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=run_webhook, args=(i,), name=f"webhook-{i}") for i in range(workers)]
+    for process in processes:
+        process.start()
+    logger.info(f"{workers} ta webhook jarayoni ishga tushirildi.")
+
+    stop_requested_at = []
+
+    def terminate_children(signum, frame):
+        if stop_requested_at:
+            return
+        stop_requested_at.append(time.monotonic())
+        logger.info(f"{signal.Signals(signum).name} olindi, webhook jarayonlari to'xtatilmoqda...")
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, terminate_children)
+    signal.signal(signal.SIGINT, terminate_children)
+    while any(process.is_alive() for process in processes):
+        for process in processes:
+            process.join(timeout=0.5)
+        if stop_requested_at and time.monotonic() - stop_requested_at[0] > SHUTDOWN_TIMEOUT + 5:
+            for process in processes:
+                if process.is_alive():
+                    logger.warning(f"{process.name} o'z vaqtida to'xtamadi, majburan o'chirilmoqda.")
+                    process.kill()
+    logger.info("Barcha webhook jarayonlari to'xtadi.")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["delete-webhook"]:
+        asyncio.run(delete_webhook())
+    elif WEB_WORKERS > 1:
+        run_webhook_workers(WEB_WORKERS)
+    else:
+        run_webhook()
+
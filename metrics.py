@@ -0,0 +1,174 @@
+import functools
+import os
+import time
+from bisect import bisect_left
+
+from aiohttp import web
+from redis.asyncio import Redis
+
+# Prometheus matn formatidagi ko'rsatkichlar (/metrics).
+# Tashqi kutubxonasiz: gistogramma va hisoblagichlar jarayon xotirasida saqlanadi, bitta kuzatish -
+# bisect va bir nechta qo'shish amali, shuning uchun production'da doim yoqilgan holda qoldirish mumkin.
+# Gauge qiymatlari (ulanish puli, navbatlar) faqat /metrics so'ralganda funksiyalar orqali hisoblanadi.
+# Bir nechta jarayon rejimida har bir jarayon faqat o'z ko'rsatkichlarini beradi (pid yorlig'i bilan):
+# asosiy portdagi /metrics ni qaysi jarayon olishini yadro tanlaydi, shuning uchun har bir jarayon
+# o'zining METRICS_PORT + i portida alohida so'raladi (create_metrics_app).
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_PID = str(os.getpid())
+
+_descriptions = {} # nom -> (turi, tavsif)
+_histograms = {} # nom -> {yorliqlar: [bucketlar hisobi, yig'indi, soni]}
+_counters = {} # nom -> {yorliqlar: qiymat}
+_gauges = {} # nom -> funksiya: {yorliqlar: qiymat} yoki son qaytaradi
+
+
+def describe(name: str, metric_type: str, description: str):
+    _descriptions[name] = (metric_type, description)
+
+
+def observe(name: str, value: float, **labels):
+    """
+    Gistogrammaga bitta qiymat qo'shadi.
+    """
+    series = _histograms.setdefault(name, {})
+    key = tuple(sorted(labels.items()))
+    entry = series.get(key)
+    if entry is None:
+        entry = series[key] = [[0] * len(DEFAULT_BUCKETS), 0.0, 0]
+    index = bisect_left(DEFAULT_BUCKETS, value)
+    if index < len(DEFAULT_BUCKETS):
+        entry[0][index] += 1
+    entry[1] += value
+    entry[2] += 1
+
+
+def inc(name: str, value: float = 1, **labels):
+    """
+    Hisoblagichni oshiradi.
+    """
+    series = _counters.setdefault(name, {})
+    key = tuple(sorted(labels.items()))
+    series[key] = series.get(key, 0) + value
+
+
+def register_gauge(name: str, description: str, func):
+    """
+    /metrics so'ralganda func() orqali hisoblanadigan gauge qo'shadi.
+    """
+    describe(name, 'gauge', description)
+    _gauges[name] = func
+
+
+def timed(name: str):
+    """
+    Asinxron funksiyaning bajarilish vaqtini name gistogrammasiga function yorlig'i bilan yozadigan dekorator.
+    """
+    def decorator(func):
+        function_name = func.__name__
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started_at = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                observe(name, time.perf_counter() - started_at, function=function_name)
+        return wrapper
+    return decorator
+
+
+def _format_labels(labels) -> str:
+    labels = (('pid', _PID),) + tuple(labels)
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+
+def render() -> str:
+    """
+    Barcha ko'rsatkichlarni Prometheus matn formatida qaytaradi.
+    """
+    lines = []
+
+    def header(name, default_type):
+        metric_type, description = _descriptions.get(name, (default_type, name))
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {metric_type}")
+
+    for name, series in _histograms.items():
+        header(name, 'histogram')
+        for key, (buckets, total, count) in series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(DEFAULT_BUCKETS, buckets):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_format_labels(key + (('le', bound),))} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(key + (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{_format_labels(key)} {total}")
+            lines.append(f"{name}_count{_format_labels(key)} {count}")
+
+    for name, series in _counters.items():
+        header(name, 'counter')
+        for key, value in series.items():
+            lines.append(f"{name}{_format_labels(key)} {value}")
+
+    for name, func in _gauges.items():
+        try:
+            value = func()
+        except Exception:
+            continue
+        header(name, 'gauge')
+        values = value.items() if isinstance(value, dict) else [((), value)]
+        for key, gauge_value in values:
+            lines.append(f"{name}{_format_labels(key)} {gauge_value}")
+
+    return '\n'.join(lines) + '\n'
+
+
+async def metrics_handler(request: web.Request):
+    return web.Response(body=render().encode(), headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+
+def create_metrics_app() -> web.Application:
+    """
+    Faqat /metrics dan iborat ilova (jarayonning alohida ko'rsatkichlar porti uchun).
+    """
+    app = web.Application()
+    app.router.add_get('/metrics', metrics_handler)
+    return app
+
+
+async def handler_metrics_middleware(handler, event, data):
+    """
+    aiogram middleware: har bir handlerning bajarilish vaqti va xatolarini yozadi.
+    """
+    handler_object = data.get('handler')
+    name = handler_object.callback.__name__ if handler_object is not None else 'unknown'
+    started_at = time.perf_counter()
+    try:
+        return await handler(event, data)
+    except Exception:
+        inc('bot_handler_errors_total', handler=name)
+        raise
+    finally:
+        observe('bot_handler_duration_seconds', time.perf_counter() - started_at, handler=name)
+
+
+class InstrumentedRedis(Redis):
+    """
+    Har bir buyruqning bajarilish vaqtini yozadigan Redis klienti (FSM storage ham shu orqali ishlaydi).
+    """
+
+    async def execute_command(self, *args, **options):
+        started_at = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            observe('redis_command_duration_seconds', time.perf_counter() - started_at, command=str(args[0]).upper())
+
+
+describe('bot_handler_duration_seconds', 'histogram', "Bot handlerlarining bajarilish vaqti")
+describe('bot_handler_errors_total', 'counter', "Handlerlarda yuz bergan xatolar soni")
+describe('db_call_duration_seconds', 'histogram', "database.py funksiyalarining bajarilish vaqti")
+describe('redis_command_duration_seconds', 'histogram', "Redis buyruqlarining bajarilish vaqti")
+describe('tts_generate_duration_seconds', 'histogram', "generate_audio bajarilish vaqti (result: hit, miss, error)")
+describe('tts_requests_total', 'counter', "generate_audio chaqiruvlari (result: hit, miss, error)")
+describe('webhook_request_duration_seconds', 'histogram', "Webhook so'roviga javob berish vaqti")
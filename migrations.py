@@ -0,0 +1,277 @@
+import logging
+
+import asyncpg
+
+from config import SRS_INITIAL_EASE
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Bir nechta jarayon bir vaqtda migratsiya qilmasligi uchun PostgreSQL advisory lock kaliti
+MIGRATION_LOCK_KEY = 7_302_115
+
+# Ma'lumotlar bazasi sxemasining versiyalari. Har bir migratsiya faqat bir marta bajariladi.
+# 'concurrent' migratsiyalar (CREATE INDEX CONCURRENTLY) tranzaksiyadan tashqarida bajariladi,
+# shunda katta jadvallarda indeks qurilayotganda yozish bloklanmaydi. Ular uchun 'index' - indeks nomi.
+# 'batch_sql' - katta jadvaldagi mavjud qatorlarni to'ldirish: 'sql' dan keyin 'batch_table' jadvalining
+# user_id oralig'i bo'yicha ($1 - $2) partiyalab, har bir partiya alohida qisqa tranzaksiyada bajariladi.
+# U qayta bajarilsa ham natija o'zgarmaydigan (masalan, faqat hali to'ldirilmagan qatorlarni yangilaydigan) bo'lishi kerak.
+MIGRATION_BATCH_SIZE = 1000
+MIGRATIONS = [
+    {
+        'version': 1,
+        'description': "Asosiy jadvallar",
+        'sql': '''
+            CREATE TABLE IF NOT EXISTS words (
+                id SERIAL PRIMARY KEY,
+                english_word TEXT NOT NULL UNIQUE,
+                uzbek_word TEXT NOT NULL,
+                audio_url TEXT
+            );
+            CREATE TABLE IF NOT EXISTS users (
+                id SERIAL PRIMARY KEY,
+                telegram_id BIGINT NOT NULL UNIQUE,
+                last_word_fetch_date TIMESTAMP DEFAULT NULL,
+                last_test_date TIMESTAMP DEFAULT NULL
+            );
+            CREATE TABLE IF NOT EXISTS user_words (
+                id SERIAL PRIMARY KEY,
+                user_id INTEGER REFERENCES users(id),
+                word_id INTEGER REFERENCES words(id),
+                is_learned BOOLEAN DEFAULT FALSE,
+                correct_attempts INTEGER DEFAULT 0,
+                total_attempts INTEGER DEFAULT 0,
+                last_attempt_date TIMESTAMP DEFAULT NULL,
+                date_assigned TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE (user_id, word_id)
+            );
+        ''',
+    },
+    {
+        'version': 2,
+        'description': "get_user_test_words uchun (user_id, is_learned, date_assigned) indeksi",
+        'concurrent': True,
+        'index': 'idx_user_words_user_learned_assigned',
+        'sql': '''
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_words_user_learned_assigned
+            ON user_words (user_id, is_learned, date_assigned);
+        ''',
+    },
+    {
+        'version': 3,
+        'description': "users.last_word_fetch_date bo'yicha qidiruv indeksi",
+        'concurrent': True,
+        'index': 'idx_users_last_word_fetch_date',
+        'sql': '''
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_last_word_fetch_date
+            ON users (last_word_fetch_date);
+        ''',
+    },
+    {
+        'version': 4,
+        'description': "Test eslatmasi yuborilgan vaqt (users.test_reminder_sent_at)",
+        'sql': '''
+            ALTER TABLE users ADD COLUMN IF NOT EXISTS test_reminder_sent_at TIMESTAMP DEFAULT NULL;
+        ''',
+    },
+    {
+        'version': 5,
+        'description': "Takrorlash jadvali: user_words.ease, interval_days, due_at",
+        # Ustunlar qo'shish faqat metama'lumotni o'zgartiradi (jadval qayta yozilmaydi).
+        # Mavjud so'zlar: o'rganilmaganlari berilganidan 1 kun o'tib (2 kunlik oynadan chiqib qolganlari ham),
+        # o'rganilganlari oxirgi urinishdan 6 kun o'tib takrorlanadi
+        'sql': f'''
+            ALTER TABLE user_words ADD COLUMN IF NOT EXISTS ease REAL NOT NULL DEFAULT {SRS_INITIAL_EASE};
+            ALTER TABLE user_words ADD COLUMN IF NOT EXISTS interval_days INTEGER NOT NULL DEFAULT 0;
+            ALTER TABLE user_words ADD COLUMN IF NOT EXISTS due_at TIMESTAMP DEFAULT NULL;
+        ''',
+        'batch_table': 'user_words',
+        'batch_sql': '''
+            UPDATE user_words SET
+                interval_days = CASE WHEN is_learned THEN 6 ELSE 0 END,
+                due_at = CASE WHEN is_learned THEN COALESCE(last_attempt_date, date_assigned) + INTERVAL '6 days'
+                              ELSE date_assigned + INTERVAL '1 day' END
+            WHERE user_id BETWEEN $1 AND $2 AND due_at IS NULL;
+        ''',
+    },
+    {
+        'version': 6,
+        'description': "Takrorlash navbati uchun (user_id, due_at) indeksi",
+        'concurrent': True,
+        'index': 'idx_user_words_user_due',
+        'sql': '''
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_words_user_due
+            ON user_words (user_id, due_at);
+        ''',
+    },
+    {
+        'version': 7,
+        'description': "Kunlik faollik jadvali (reytinglar va seriyalarni qayta qurish uchun)",
+        'sql': '''
+            CREATE TABLE IF NOT EXISTS user_daily_activity (
+                user_id INTEGER NOT NULL REFERENCES users(id),
+                day DATE NOT NULL,
+                correct_attempts INTEGER NOT NULL DEFAULT 0,
+                total_attempts INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, day)
+            );
+        ''',
+    },
+    {
+        'version': 8,
+        'description': "Foydalanuvchi progressi yig'indilari (user_stats)",
+        # Mavjud foydalanuvchilar uchun backfill_user_stats.py bilan to'ldiriladi
+        'sql': '''
+            CREATE TABLE IF NOT EXISTS user_stats (
+                user_id INTEGER PRIMARY KEY REFERENCES users(id),
+                learned_count INTEGER NOT NULL DEFAULT 0,
+                total_attempts INTEGER NOT NULL DEFAULT 0,
+                correct_attempts INTEGER NOT NULL DEFAULT 0,
+                tests_passed INTEGER NOT NULL DEFAULT 0,
+                tests_failed INTEGER NOT NULL DEFAULT 0,
+                last_activity_at TIMESTAMP DEFAULT NULL
+            );
+        ''',
+    },
+    {
+        'version': 9,
+        'description': "Foydalanuvchining eng yaqin takrorlash vaqti (users.next_due_at)",
+        # next_due_at = MIN(user_words.due_at): eslatmalar faqat vaqti kelgan foydalanuvchilarni indeks bo'yicha o'qiydi
+        'sql': '''
+            ALTER TABLE users ADD COLUMN IF NOT EXISTS next_due_at TIMESTAMP DEFAULT NULL;
+        ''',
+        'batch_table': 'user_words',
+        'batch_sql': '''
+            UPDATE users u SET next_due_at = d.next_due_at
+            FROM (
+                SELECT user_id, MIN(due_at) AS next_due_at FROM user_words
+                WHERE user_id BETWEEN $1 AND $2
+                GROUP BY user_id
+            ) d
+            WHERE u.id = d.user_id AND u.next_due_at IS DISTINCT FROM d.next_due_at;
+        ''',
+    },
+    {
+        'version': 10,
+        'description': "Test eslatmalari uchun (next_due_at, id) indeksi",
+        'concurrent': True,
+        'index': 'idx_users_next_due',
+        'sql': '''
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_next_due
+            ON users (next_due_at, id);
+        ''',
+    },
+    # DROP INDEX CONCURRENTLY bitta so'rovda faqat bitta indeksni o'chira oladi
+    {
+        'version': 11,
+        'description': "Ishlatilmay qolgan idx_user_words_user_learned_assigned indeksini o'chirish",
+        'concurrent': True,
+        'index': 'idx_user_words_user_learned_assigned',
+        'sql': '''
+            DROP INDEX CONCURRENTLY IF EXISTS idx_user_words_user_learned_assigned;
+        ''',
+    },
+    {
+        'version': 12,
+        'description': "Ishlatilmay qolgan idx_users_last_word_fetch_date indeksini o'chirish",
+        'concurrent': True,
+        'index': 'idx_users_last_word_fetch_date',
+        'sql': '''
+            DROP INDEX CONCURRENTLY IF EXISTS idx_users_last_word_fetch_date;
+        ''',
+    },
+]
+
+LATEST_VERSION = MIGRATIONS[-1]['version']
+
+
+async def get_schema_version(conn) -> int:
+    """
+    Bazada qo'llangan oxirgi migratsiya versiyasini qaytaradi (hali hech narsa bo'lmasa 0).
+    """
+    try:
+        version = await conn.fetchval("SELECT MAX(version) FROM schema_migrations;")
+    except asyncpg.UndefinedTableError:
+        return 0
+    return version or 0
+
+
+async def _drop_invalid_index(conn, index_name: str):
+    """
+    Oldingi muvaffaqiyatsiz CONCURRENTLY urinishidan qolgan yaroqsiz indeksni o'chiradi.
+    Aks holda 'IF NOT EXISTS' uni mavjud deb hisoblab, qayta qurmaydi.
+    """
+    is_invalid = await conn.fetchval('''
+        SELECT NOT i.indisvalid FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = $1;
+    ''', index_name)
+    if is_invalid:
+        logger.warning(f"Yaroqsiz indeks qayta quriladi: {index_name}")
+        await conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name};")
+
+
+async def _run_batches(conn, migration: dict):
+    """
+    Migratsiyaning batch_sql qismini user_id oralig'i bo'yicha partiyalab bajaradi.
+    """
+    table = migration['batch_table']
+    min_id, max_id = await conn.fetchrow(f"SELECT MIN(user_id), MAX(user_id) FROM {table};")
+    if min_id is None:
+        return
+    for first_id in range(min_id, max_id + 1, MIGRATION_BATCH_SIZE):
+        last_id = min(max_id, first_id + MIGRATION_BATCH_SIZE - 1)
+        async with conn.transaction():
+            await conn.execute(migration['batch_sql'], first_id, last_id)
+        if (first_id - min_id) // MIGRATION_BATCH_SIZE % 100 == 0:
+            logger.info(f"Migratsiya {migration['version']}: {table} {last_id - min_id + 1}/{max_id - min_id + 1} ID")
+
+
+async def run_migrations(pool):
+    """
+    Qo'llanmagan migratsiyalarni bajaradi.
+    Sxema allaqachon oxirgi versiyada bo'lsa, bitta so'rovdan keyin hech qanday DDL bajarilmaydi.
+    """
+    async with pool.acquire() as conn:
+        if await get_schema_version(conn) >= LATEST_VERSION:
+            logger.info(f"Ma'lumotlar bazasi sxemasi dolzarb (versiya {LATEST_VERSION}).")
+            return
+
+        await conn.execute("SELECT pg_advisory_lock($1);", MIGRATION_LOCK_KEY)
+        try:
+            await conn.execute('''
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    description TEXT NOT NULL,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );
+            ''')
+            # Qulfni kutayotganda boshqa jarayon migratsiyalarni bajarib qo'ygan bo'lishi mumkin
+            current_version = await get_schema_version(conn)
+            for migration in MIGRATIONS:
+                if migration['version'] <= current_version:
+                    continue
+                logger.info(f"Migratsiya {migration['version']} bajarilmoqda: {migration['description']}")
+                if migration.get('concurrent'):
+                    await _drop_invalid_index(conn, migration['index'])
+                    await conn.execute(migration['sql'])
+                    await conn.execute('''
+                        INSERT INTO schema_migrations (version, description) VALUES ($1, $2);
+                    ''', migration['version'], migration['description'])
+                elif migration.get('batch_sql'):
+                    # Versiya barcha partiyalar tugagandan keyingina yoziladi; uzilib qolsa, qayta bajariladi
+                    async with conn.transaction():
+                        await conn.execute(migration['sql'])
+                    await _run_batches(conn, migration)
+                    await conn.execute('''
+                        INSERT INTO schema_migrations (version, description) VALUES ($1, $2);
+                    ''', migration['version'], migration['description'])
+                else:
+                    async with conn.transaction():
+                        await conn.execute(migration['sql'])
+                        await conn.execute('''
+                            INSERT INTO schema_migrations (version, description) VALUES ($1, $2);
+                        ''', migration['version'], migration['description'])
+            logger.info(f"Ma'lumotlar bazasi sxemasi {LATEST_VERSION}-versiyaga yangilandi.")
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock($1);", MIGRATION_LOCK_KEY)
@@ -0,0 +1,135 @@
+"""
+Lug'atdagi barcha so'zlar talaffuzini oldindan generatsiya qilish vazifasi.
+
+Yangi lug'at ishga tushishidan oldin audio keshni to'liq tayyorlab qo'yadi,
+shunda hech bir foydalanuvchi birinchi testida sintezni kutib qolmaydi.
+Generatsiya paytida keshdan fayllar o'chirilmaydi: kesh hajmi AUDIO_CACHE_MAX_BYTES dan oshsa,
+vazifa xato bilan to'xtaydi (nazorat nuqtasidagi barcha audiolar diskda qoladi) - chegarani oshirib,
+qayta ishga tushirish kerak.
+
+Ishlatish:
+    python pregenerate_audio.py --workers 8
+    python pregenerate_audio.py --engine stub --reset
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+
+from config import AUDIO_CACHE_DIR, AUDIO_CACHE_MAX_BYTES, TTS_MAX_WORKERS, TTS_ENGINE
+import database
+import tts_service
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHECKPOINT = os.path.join(AUDIO_CACHE_DIR, ".pregenerate_checkpoint")
+
+
+def read_checkpoint(path: str) -> int:
+    """
+    Oxirgi qayta ishlangan so'z ID'sini o'qiydi (fayl bo'lmasa 0).
+    """
+    try:
+        with open(path) as f:
+            return int(f.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def write_checkpoint(path: str, last_word_id: int):
+    """
+    Oxirgi qayta ishlangan so'z ID'sini atomar tarzda yozadi.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(str(last_word_id))
+    os.replace(tmp_path, path)
+
+
+async def pregenerate(workers: int, batch_size: int, checkpoint_path: str):
+    """
+    'words' jadvalini partiyalab aylanib chiqadi va keshda yo'q audiolarni sintez qiladi.
+    """
+    tts_service.set_tts_workers(workers)
+    # Aks holda yangi audiolar nazorat nuqtasi "tayyor" deb belgilagan oldingi audiolarni o'chirib yuborardi
+    tts_service.set_cache_eviction(False)
+    last_word_id = read_checkpoint(checkpoint_path)
+    if last_word_id:
+        logger.info(f"Nazorat nuqtasidan davom etilmoqda: so'z ID {last_word_id} dan keyin.")
+
+    total_words = await database.get_total_words_count()
+    processed = synthesized = skipped = failed = 0
+    started_at = time.monotonic()
+
+    while True:
+        words = await database.get_words_batch(last_word_id, batch_size)
+        if not words:
+            break
+
+        missing = [w for w in words if not tts_service.is_audio_cached(w['english_word'])]
+        skipped += len(words) - len(missing)
+        # Oqimlar puli bir vaqtda ishlaydigan sintezlar sonini 'workers' bilan cheklaydi
+        results = await asyncio.gather(*(tts_service.generate_audio(w['english_word']) for w in missing))
+        for word, audio_path in zip(missing, results):
+            if audio_path:
+                synthesized += 1
+            else:
+                failed += 1
+                logger.warning(f"Audio yaratilmadi: {word['id']} - {word['english_word']}")
+
+        processed += len(words)
+        last_word_id = words[-1]['id']
+        write_checkpoint(checkpoint_path, last_word_id)
+
+        cache_bytes = tts_service.get_cache_bytes()
+        if cache_bytes > AUDIO_CACHE_MAX_BYTES:
+            logger.error(
+                f"Audio kesh hajmi ({cache_bytes} bayt) AUDIO_CACHE_MAX_BYTES ({AUDIO_CACHE_MAX_BYTES} bayt) dan oshdi: "
+                f"bot ishga tushganda eski audiolarni o'chirib yuboradi. Chegarani oshirib, qayta ishga tushiring "
+                f"(so'z ID {last_word_id} dan davom etiladi)."
+            )
+            failed += 1
+            break
+
+        elapsed = time.monotonic() - started_at
+        logger.info(
+            f"Jarayon: {processed}/{total_words} so'z (ID {last_word_id} gacha), "
+            f"sintez: {synthesized}, keshda bor: {skipped}, xato: {failed}, "
+            f"tezlik: {synthesized / elapsed if elapsed else 0:.1f} audio/s"
+        )
+
+    elapsed = time.monotonic() - started_at
+    logger.info(
+        f"Tugadi: {processed} so'z {elapsed:.1f} soniyada qayta ishlandi. "
+        f"Sintez: {synthesized}, keshda bor: {skipped}, xato: {failed}."
+    )
+    return failed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Lug'at uchun audio keshni oldindan to'ldirish")
+    parser.add_argument("--workers", type=int, default=TTS_MAX_WORKERS, help="Parallel sintez oqimlari soni")
+    parser.add_argument("--batch-size", type=int, default=200, help="Bir partiyadagi so'zlar soni")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT, help="Nazorat nuqtasi fayli")
+    parser.add_argument("--engine", default=TTS_ENGINE, choices=sorted(tts_service.TTS_ENGINES), help="TTS dvigateli")
+    parser.add_argument("--reset", action="store_true", help="Nazorat nuqtasini o'chirib, boshidan boshlash")
+    args = parser.parse_args()
+
+    tts_service.set_tts_engine(args.engine)
+    if args.reset and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+    await database.init_db_pool()
+    try:
+        failed = await pregenerate(args.workers, args.batch_size, args.checkpoint)
+    finally:
+        await database.close_db_pool()
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
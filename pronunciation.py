@@ -0,0 +1,61 @@
+import logging
+
+from aiogram import Bot, types
+from aiogram.exceptions import TelegramBadRequest
+
+from database import set_word_audio_file_id
+from tts_service import generate_audio
+import vocab_cache
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Redis'dagi nusxa: word_id -> Telegram file_id (boshqa jarayonlar yuklagan audiolar ham shu yerda ko'rinadi)
+AUDIO_FILE_IDS_KEY = "word_audio_file_ids"
+
+
+async def send_word_pronunciation(bot: Bot, redis, chat_id: int, word_id: int, english_word: str):
+    """
+    So'z talaffuzini yuboradi.
+    Audio Telegramga faqat birinchi marta yuklanadi, keyin uning file_id'si orqali yuboriladi.
+    Telegram eski file_id'ni rad etsagina audio qayta yuklanadi.
+    """
+    audio_file_id = vocab_cache.get_audio_file_id(word_id)
+    if audio_file_id is None:
+        cached = await redis.hget(AUDIO_FILE_IDS_KEY, word_id)
+        if cached:
+            audio_file_id = cached.decode() if isinstance(cached, bytes) else cached
+            vocab_cache.set_audio_file_id(word_id, audio_file_id)
+
+    if audio_file_id:
+        try:
+            await bot.send_audio(chat_id, audio_file_id)
+            return
+        except TelegramBadRequest as e:
+            logger.warning(f"So'z {word_id} uchun file_id rad etildi, audio qayta yuklanadi: {e}")
+            await _forget_file_id(redis, word_id)
+
+    audio_path = await generate_audio(english_word, lang='en')
+    if not audio_path:
+        return
+    sent = await bot.send_audio(chat_id, types.FSInputFile(audio_path, filename=f"{english_word}.mp3"))
+    if sent.audio:
+        await _remember_file_id(redis, word_id, sent.audio.file_id)
+
+
+async def _remember_file_id(redis, word_id: int, audio_file_id: str):
+    """
+    Yangi file_id'ni bazaga, Redis'ga va lug'at keshiga yozadi.
+    """
+    vocab_cache.set_audio_file_id(word_id, audio_file_id)
+    await redis.hset(AUDIO_FILE_IDS_KEY, word_id, audio_file_id)
+    await set_word_audio_file_id(word_id, audio_file_id)
+
+
+async def _forget_file_id(redis, word_id: int):
+    """
+    Eskirgan file_id'ni hamma joydan o'chiradi.
+    """
+    vocab_cache.set_audio_file_id(word_id, None)
+    await redis.hdel(AUDIO_FILE_IDS_KEY, word_id)
+    await set_word_audio_file_id(word_id, None)
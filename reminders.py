@@ -0,0 +1,60 @@
+import asyncio
+from datetime import datetime
+import logging
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError
+
+from config import REMINDER_INTERVAL, REMINDER_BATCH_SIZE
+from database import iter_test_due_users, claim_test_reminders
+from send_scheduler import bulk_priority
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Takrorlash vaqti kelgan (users.next_due_at - so'zlari due_at ining eng kichigi) foydalanuvchilarga eslatma yuboruvchi fon vazifasi.
+# Eslatma har faollikdan (so'z olish yoki test) keyin ko'pi bilan bir marta yuboriladi.
+# Har REMINDER_INTERVAL soniyada bazadan test vaqti kelganlar partiyalab o'qiladi, har bir partiya
+# bazada belgilanadi (claim_test_reminders) va shundan keyingina xabarlar yuboriladi. Xabarlar past
+# ustuvorlikda yuboriladi: send_scheduler ularni Telegram limitlari ichida, interaktiv javoblardan keyin o'tkazadi.
+REMINDER_TEXT = "Sizning so'zlaringizni takrorlash (test) vaqti keldi! Testni boshlash uchun /words buyrug'ini bosing."
+
+
+async def _send_reminder(bot: Bot, telegram_id: int) -> bool:
+    try:
+        with bulk_priority():
+            await bot.send_message(telegram_id, REMINDER_TEXT)
+        return True
+    except TelegramAPIError as e:
+        # Masalan, foydalanuvchi botni bloklagan
+        logger.info(f"Foydalanuvchi {telegram_id} ga eslatma yuborilmadi: {e}")
+        return False
+
+
+async def send_test_reminders(bot: Bot, batch_size: int = REMINDER_BATCH_SIZE) -> dict:
+    """
+    Bitta aylanma: test vaqti kelgan barcha foydalanuvchilarga eslatma yuboradi va statistikani qaytaradi.
+    """
+    now = datetime.now()
+    stats = {'due': 0, 'claimed': 0, 'sent': 0}
+    async for user_ids in iter_test_due_users(now, batch_size):
+        stats['due'] += len(user_ids)
+        telegram_ids = await claim_test_reminders(user_ids, now)
+        stats['claimed'] += len(telegram_ids)
+        results = await asyncio.gather(*(_send_reminder(bot, telegram_id) for telegram_id in telegram_ids))
+        stats['sent'] += sum(results)
+    return stats
+
+
+async def run_reminder_worker(bot: Bot, interval: int = REMINDER_INTERVAL):
+    """
+    Eslatmalarni muntazam yuborib turadigan fon vazifasi.
+    """
+    while True:
+        try:
+            stats = await send_test_reminders(bot)
+            if stats['due']:
+                logger.info(f"Test eslatmalari: {stats['due']} ta foydalanuvchi, {stats['claimed']} ta belgilandi, {stats['sent']} ta yuborildi.")
+        except Exception as e:
+            logger.error(f"Test eslatmalarini yuborishda xato: {e}")
+        await asyncio.sleep(interval)
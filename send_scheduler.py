@@ -0,0 +1,188 @@
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+import heapq
+import itertools
+import logging
+import time
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import EditMessageCaption, EditMessageMedia, EditMessageReplyMarkup, EditMessageText
+
+from config import SEND_GLOBAL_RATE, SEND_CHAT_RATE, SEND_CHAT_BURST, SEND_MAX_RETRIES, WEB_WORKERS
+import metrics
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Telegramga chiqadigan barcha so'rovlar bot sessiyasining middleware'i orqali o'tadi.
+# chat_id li so'rovlar (send_*, edit_*, ...) ikki cheklovdan o'tadi:
+#   - har bir chat uchun token bucket (SEND_CHAT_RATE xabar/s, SEND_CHAT_BURST tagacha ketma-ket);
+#     mavjud xabarni tahrirlash (edit_*) chatga yangi xabar qo'shmaydi, shuning uchun bu cheklovga kirmaydi
+#   - umumiy token bucket (SEND_GLOBAL_RATE xabar/s); umumiy navbatda interaktiv javoblar ommaviy xabarlardan oldin o'tadi
+#     bir nechta jarayon rejimida har bir jarayon SEND_GLOBAL_RATE / WEB_WORKERS ulushini oladi, jami limit o'zgarmaydi
+# answer_callback_query, get_me va chat_id siz boshqa so'rovlar navbatsiz yuboriladi.
+# Telegram baribir 429 (RetryAfter) qaytarsa, chat (yoki butun bot) ko'rsatilgan vaqtga to'xtatiladi va so'rov qayta yuboriladi.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: 'interactive', PRIORITY_BULK: 'bulk'}
+
+# Faqat umumiy limitdan o'tadigan so'rovlar
+CHAT_EXEMPT_METHODS = (EditMessageText, EditMessageReplyMarkup, EditMessageCaption, EditMessageMedia)
+
+# Chat bucketlari soni shundan oshsa, to'lib turgan (bo'sh turgan chatlarning) bucketlari o'chiriladi
+CHAT_BUCKETS_PRUNE_SIZE = 10_000
+
+_priority = ContextVar('send_priority', default=PRIORITY_INTERACTIVE)
+
+
+@contextmanager
+def bulk_priority():
+    """
+    Blok ichidagi yuborishlarni ommaviy (past ustuvorlikdagi) deb belgilaydi.
+    """
+    token = _priority.set(PRIORITY_BULK)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    """
+    Token bucket (GCRA ko'rinishida): har bir reserve() bitta token band qiladi
+    va u bo'shashigacha qancha kutish kerakligini qaytaradi.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.interval = 1.0 / rate
+        self.tolerance = (burst - 1) * self.interval
+        self.tat = 0.0 # navbatdagi token "nazariy" vaqti
+
+    def reserve(self, now: float) -> float:
+        tat = max(self.tat, now)
+        self.tat = tat + self.interval
+        return max(0.0, tat - self.tolerance - now)
+
+    def pause_until(self, until: float):
+        self.tat = max(self.tat, until + self.tolerance)
+
+    def is_idle(self, now: float) -> bool:
+        return self.tat <= now
+
+
+class SendScheduler(BaseRequestMiddleware):
+    def __init__(self, global_rate: float = SEND_GLOBAL_RATE / WEB_WORKERS, chat_rate: float = SEND_CHAT_RATE,
+                 chat_burst: int = SEND_CHAT_BURST, max_retries: int = SEND_MAX_RETRIES):
+        self.global_bucket = TokenBucket(global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._chat_buckets = {}
+        self._waiters = [] # (ustuvorlik, tartib raqami, future)
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._dispatcher = None
+        self.metrics = {
+            'sent': 0,
+            'retries': 0,
+            'failed': 0,
+            'waiting': 0,
+            'wait_seconds_total': 0.0,
+            'wait_seconds_max': 0.0,
+        }
+
+    def _chat_bucket(self, chat_id, now: float) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= CHAT_BUCKETS_PRUNE_SIZE:
+                self._chat_buckets = {key: b for key, b in self._chat_buckets.items() if not b.is_idle(now)}
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    async def _dispatch(self):
+        """
+        Umumiy tokenlarni kutayotgan so'rovlarga ustuvorlik tartibida tarqatadi.
+        """
+        while True:
+            while not self._waiters:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            delay = self.global_bucket.reserve(time.monotonic())
+            if delay:
+                await asyncio.sleep(delay)
+            while self._waiters:
+                _, _, future = heapq.heappop(self._waiters)
+                if not future.done(): # bekor qilingan so'rovga token berilmaydi
+                    future.set_result(None)
+                    break
+
+    async def _acquire(self, chat_id, use_chat_bucket: bool = True):
+        loop = asyncio.get_running_loop()
+        started_at = time.monotonic()
+        self.metrics['waiting'] += 1
+        try:
+            if use_chat_bucket:
+                delay = self._chat_bucket(chat_id, started_at).reserve(started_at)
+                if delay:
+                    await asyncio.sleep(delay)
+
+            if self._dispatcher is None or self._dispatcher.done():
+                self._dispatcher = asyncio.create_task(self._dispatch())
+            future = loop.create_future()
+            heapq.heappush(self._waiters, (_priority.get(), next(self._counter), future))
+            self._wakeup.set()
+            await future
+        finally:
+            self.metrics['waiting'] -= 1
+        waited = time.monotonic() - started_at
+        self.metrics['wait_seconds_total'] += waited
+        self.metrics['wait_seconds_max'] = max(self.metrics['wait_seconds_max'], waited)
+        metrics.observe('telegram_send_wait_seconds', waited, priority=PRIORITY_NAMES[_priority.get()])
+
+    async def __call__(self, make_request, bot: Bot, method):
+        chat_id = getattr(method, 'chat_id', None)
+        if chat_id is None:
+            # answer_callback_query, get_me, set_webhook va h.k. chat limitlariga kirmaydi
+            return await make_request(bot, method)
+        use_chat_bucket = not isinstance(method, CHAT_EXEMPT_METHODS)
+
+        attempt = 0
+        while True:
+            await self._acquire(chat_id, use_chat_bucket)
+            try:
+                response = await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    self.metrics['failed'] += 1
+                    raise
+                self.metrics['retries'] += 1
+                logger.warning(f"Telegram limiti ({type(method).__name__}, chat {chat_id}): {e.retry_after} soniyadan keyin qayta yuboriladi.")
+                until = time.monotonic() + e.retry_after
+                self._chat_bucket(chat_id, until).pause_until(until)
+                if _priority.get() == PRIORITY_BULK:
+                    # Ommaviy yuborishda 429 odatda umumiy limit oshganini bildiradi
+                    self.global_bucket.pause_until(until)
+                if not use_chat_bucket:
+                    # Tahrirlash chat bucketini kutmaydi, shuning uchun ko'rsatilgan vaqt shu yerda kutiladi
+                    await asyncio.sleep(e.retry_after)
+                continue
+            self.metrics['sent'] += 1
+            return response
+
+    def queue_depth(self) -> int:
+        """
+        Token kutayotgan so'rovlar soni.
+        """
+        return self.metrics['waiting']
+
+    def get_metrics(self) -> dict:
+        return {**self.metrics, 'queue_depth': self.queue_depth()}
+
+
+send_scheduler = SendScheduler()
+
+metrics.describe('telegram_send_wait_seconds', 'histogram', "Telegram so'rovining limitlar navbatida kutish vaqti (priority: interactive, bulk)")
@@ -0,0 +1,87 @@
+import logging
+import random
+
+from config import TEST_OPTIONS_COUNT
+import vocab_cache
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Savol yo'nalishlari
+DIRECTION_UZBEK = 0    # O'zbekcha so'z beriladi, inglizchasi so'raladi
+DIRECTION_ENGLISH = 1  # Inglizcha so'z beriladi (talaffuzi bilan), o'zbekchasi so'raladi
+
+# Test rejasi - savollar ro'yxati. Har bir savol ixcham ro'yxat ko'rinishida saqlanadi:
+#   [word_id, direction, option_word_id_1, ..., option_word_id_N]
+# Variantlar matni emas, so'z ID'lari saqlanadi; matn vocab_cache dan olinadi.
+# To'g'ri javob - word_id ga teng bo'lgan variant. Audio havolasi ham word_id orqali aniqlanadi.
+
+
+def build_test_plan(test_words: list) -> list[list[int]]:
+    """
+    Test boshlanishida barcha savollarni bir martada tayyorlaydi:
+    yo'nalish, to'g'ri javob va aralashtirilgan variantlar.
+    """
+    plan = []
+    for word in test_words:
+        word_id = word['id']
+        direction = random.choice((DIRECTION_UZBEK, DIRECTION_ENGLISH))
+        option_ids = [word_id] + _pick_distractor_ids(word_id, direction)
+        random.shuffle(option_ids)
+        plan.append([word_id, direction] + option_ids)
+    logger.info(f"{len(plan)} ta savoldan iborat test rejasi tuzildi.")
+    return plan
+
+
+def _answer_text(word_id: int, direction: int) -> str:
+    """
+    Berilgan yo'nalishdagi savol uchun so'zning javob matnini qaytaradi.
+    """
+    english_word, uzbek_word = vocab_cache.get_word(word_id)
+    return uzbek_word if direction == DIRECTION_ENGLISH else english_word
+
+
+def _pick_distractor_ids(word_id: int, direction: int) -> list[int]:
+    """
+    Noto'g'ri variantlar uchun so'z ID'larini tanlaydi.
+    Matni to'g'ri javob bilan bir xil bo'lgan so'zlar (masalan, 'start'/'begin' - 'boshlamoq') tashlab yuboriladi.
+    """
+    needed = TEST_OPTIONS_COUNT - 1
+    correct_text = _answer_text(word_id, direction)
+    answer_key = 'uzbek_word' if direction == DIRECTION_ENGLISH else 'english_word'
+    seen_texts = {correct_text}
+    result = []
+    # Bir xil matnli so'zlar kam uchraydi, shuning uchun bir necha urinish yetarli
+    for _ in range(5):
+        for word in vocab_cache.sample_option_words(word_id, needed - len(result)):
+            if word[answer_key] in seen_texts:
+                continue
+            seen_texts.add(word[answer_key])
+            result.append(word['id'])
+        if len(result) >= needed:
+            break
+    return result
+
+
+def question_word_ids(question: list[int]) -> list[int]:
+    """
+    Savolda ishlatilgan barcha so'zlar ID'lari (so'zning o'zi va variantlar).
+    """
+    return question[2:]
+
+
+def describe_question(question: list[int]):
+    """
+    Rejadagi savolni ochib beradi: (savol so'zi, to'g'ri javob, variantlar matni, to'g'ri variant indeksi).
+    Savoldagi so'zlardan biri lug'at keshida bo'lmasa (reja tuzilgandan keyin lug'at o'zgargan), None qaytaradi.
+    """
+    word_id, direction, *option_ids = question
+    words = [vocab_cache.get_word(option_id) for option_id in option_ids]
+    if None in words:
+        return None
+    answer_index = 1 if direction == DIRECTION_ENGLISH else 0
+    options = [word[answer_index] for word in words]
+    correct_option_index = option_ids.index(word_id)
+    english_word, uzbek_word = words[correct_option_index]
+    asked_word = english_word if direction == DIRECTION_ENGLISH else uzbek_word
+    return asked_word, options[correct_option_index], options, correct_option_index
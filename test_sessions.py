@@ -0,0 +1,162 @@
+from array import array
+from collections import OrderedDict
+import logging
+import secrets
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Test rejasi FSM holatida emas, alohida Redis kalitida bir marta yoziladi va test davomida o'zgarmaydi.
+# Javoblar ham FSM holatida emas, sessiyaning javoblar kalitida yig'iladi: har bir javob uchun bitta belgi
+# ('1' - to'g'ri, '0' - noto'g'ri), i-belgi rejadagi i-savolga tegishli, satr uzunligi - javob berilgan savollar soni.
+# Javob Lua skripti bilan faqat uning indeksi satr uzunligiga teng bo'lsa yoziladi, shuning uchun tugma bosilganda
+# FSM holatini o'qish shart emas: eski yoki takroriy bosishlar bitta atomar buyruqda rad etiladi.
+# FSM holatida faqat sessiya ID'si qoladi.
+# Reja ixcham ikkilik ko'rinishda saqlanadi: har bir savol uchun int32 sonlar
+#   [savol uzunligi, word_id, direction, option_word_id_1, ..., option_word_id_N]
+# (lug'at juda kichik bo'lsa, variantlar soni TEST_OPTIONS_COUNT dan kam bo'lishi mumkin)
+TEST_SESSION_KEY = "test_session:{}"
+TEST_ANSWERS_KEY = "test_answers:{}"
+# Tugallanmagan test rejasi va javoblari Redis'da qancha saqlanadi (soniya, har bir javobda yangilanadi)
+TEST_SESSION_TTL = 3 * 24 * 3600
+# Jarayon ichida keshlanadigan rejalar soni
+LOCAL_CACHE_SIZE = 10_000
+# Sessiya ID'si uzunligi (bayt) - barcha foydalanuvchilarning faol sessiyalari orasida to'qnashuv amalda bo'lmasligi uchun
+SESSION_ID_BYTES = 8
+# ID band bo'lib chiqsa yangisini yaratishga urinishlar soni
+SESSION_ID_ATTEMPTS = 5
+
+# KEYS: reja, javoblar; ARGV: savol indeksi, '1'/'0', TTL.
+# Qaytaradi: javob berilgan savollar soni, reja yo'q bo'lsa -1, indeks mos kelmasa -2
+_RECORD_ANSWER_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return -1
+end
+local answered = redis.call('STRLEN', KEYS[2])
+if answered ~= tonumber(ARGV[1]) then
+    return -2
+end
+redis.call('APPEND', KEYS[2], ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+return answered + 1
+"""
+
+_local_plans = OrderedDict()
+# Sessiya -> shu jarayonda yuborilgan oxirgi savol indeksi (eski tugma bosilishini tez aniqlash uchun)
+_local_cursors = {}
+
+
+def pack_plan(test_plan: list[list[int]]) -> bytes:
+    """
+    Test rejasini ixcham baytlar ketma-ketligiga aylantiradi.
+    """
+    packed = array('i')
+    for question in test_plan:
+        packed.append(len(question))
+        packed.extend(question)
+    return packed.tobytes()
+
+
+def unpack_plan(data: bytes) -> list[list[int]]:
+    """
+    Baytlardan test rejasini tiklaydi.
+    """
+    packed = array('i')
+    packed.frombytes(data)
+    test_plan = []
+    i = 0
+    while i < len(packed):
+        size = packed[i]
+        test_plan.append(packed[i + 1:i + 1 + size].tolist())
+        i += 1 + size
+    return test_plan
+
+
+def _remember_plan(session_id: str, test_plan: list[list[int]]):
+    _local_plans[session_id] = test_plan
+    _local_plans.move_to_end(session_id)
+    while len(_local_plans) > LOCAL_CACHE_SIZE:
+        old_session_id, _ = _local_plans.popitem(last=False)
+        _local_cursors.pop(old_session_id, None)
+
+
+async def create_test_session(redis, test_plan: list[list[int]]) -> str:
+    """
+    Test rejasini saqlaydi va yangi sessiya ID'sini qaytaradi.
+    Kalit NX bilan yoziladi: ID boshqa foydalanuvchining faol sessiyasiga to'g'ri kelsa, uning rejasi
+    ustidan yozilmaydi, balki yangi ID yaratiladi.
+    """
+    data = pack_plan(test_plan)
+    for _ in range(SESSION_ID_ATTEMPTS):
+        session_id = secrets.token_hex(SESSION_ID_BYTES)
+        if await redis.set(TEST_SESSION_KEY.format(session_id), data, ex=TEST_SESSION_TTL, nx=True):
+            _remember_plan(session_id, test_plan)
+            return session_id
+        logger.warning(f"Test sessiyasi ID'si band: {session_id}, qayta uriniladi.")
+    raise RuntimeError("Test sessiyasi uchun bo'sh ID topilmadi")
+
+
+async def get_test_plan(redis, session_id: str):
+    """
+    Sessiya bo'yicha test rejasini qaytaradi (avval jarayon ichidagi keshdan). Topilmasa None.
+    """
+    if not session_id:
+        return None
+    test_plan = _local_plans.get(session_id)
+    if test_plan is not None:
+        _local_plans.move_to_end(session_id)
+        return test_plan
+    data = await redis.get(TEST_SESSION_KEY.format(session_id))
+    if data is None:
+        return None
+    test_plan = unpack_plan(data)
+    _remember_plan(session_id, test_plan)
+    return test_plan
+
+
+async def delete_test_session(redis, session_id: str):
+    """
+    Yakunlangan test rejasini o'chiradi.
+    """
+    _local_plans.pop(session_id, None)
+    _local_cursors.pop(session_id, None)
+    await redis.delete(TEST_SESSION_KEY.format(session_id), TEST_ANSWERS_KEY.format(session_id))
+
+
+async def record_answer(redis, session_id: str, question_index: int, is_correct: bool) -> bool:
+    """
+    question_index-savolga javobni yozadi. Savol hali javob kutayotgan bo'lmasa (eski yoki takroriy bosish,
+    yakunlangan test) hech narsa yozilmaydi va False qaytariladi.
+    """
+    answered = await redis.register_script(_RECORD_ANSWER_SCRIPT)(
+        keys=[TEST_SESSION_KEY.format(session_id), TEST_ANSWERS_KEY.format(session_id)],
+        args=[question_index, '1' if is_correct else '0', TEST_SESSION_TTL],
+    )
+    return answered > 0
+
+
+async def get_answers(redis, session_id: str) -> list[bool]:
+    """
+    Sessiyada javob berilgan savollar natijalari (tartib bo'yicha).
+    """
+    data = await redis.get(TEST_ANSWERS_KEY.format(session_id))
+    return [char == ord('1') for char in data] if data else []
+
+
+def set_current_question(session_id: str, question_index: int):
+    """
+    Sessiyada hozir javob kutilayotgan savol indeksini eslab qoladi.
+    """
+    if session_id in _local_plans:
+        _local_cursors[session_id] = question_index
+
+
+def is_stale_answer(session_id: str, question_index: int) -> bool:
+    """
+    Tugma allaqachon javob berilgan savolga tegishli ekanini Redis'ga murojaat qilmasdan tekshiradi.
+    Jarayon bu sessiyani bilmasa False qaytaradi (keyin record_answer da tekshiriladi).
+    Indeks kursordan katta bo'lsa ham False: keyingi savollarni boshqa jarayon yuborgan bo'lishi mumkin.
+    """
+    current = _local_cursors.get(session_id)
+    return current is not None and question_index < current
@@ -1,40 +1,266 @@
 from gtts import gTTS
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import hashlib
 import os
 import logging
-import aiofiles # Asinxron fayl operatsiyalari uchun
+import time
+
+from config import AUDIO_CACHE_DIR, AUDIO_CACHE_MAX_BYTES, TTS_MAX_WORKERS, TTS_VOICE, TTS_ENGINE
+import metrics
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-async def generate_audio(text: str, lang: str = 'en'):
+# gTTS sinxron tarmoq so'rovi qiladi, shuning uchun u alohida cheklangan oqimlar pulida ishlaydi
+_executor = ThreadPoolExecutor(max_workers=TTS_MAX_WORKERS, thread_name_prefix="tts")
+# Hozir sintez qilinayotgan audiolar: kalit -> Future (bir xil so'z uchun so'rovlar birlashtiriladi)
+_inflight = {}
+# Diskdagi audio fayllar LRU tartibida: fayl yo'li -> hajmi (oxirgisi eng yaqinda ishlatilgan)
+_lru = OrderedDict()
+_lru_bytes = 0
+_lru_loaded = False
+_lru_loading = None # Katalogni o'qish vazifasi (Future)
+# False bo'lsa, kesh hajmi chegarasidan oshsa ham fayllar o'chirilmaydi (oldindan generatsiya qilish vazifasi uchun)
+_eviction_enabled = True
+
+
+def audio_cache_key(text: str, lang: str = 'en', voice: str = TTS_VOICE) -> str:
     """
-    Berilgan matnni audio faylga aylantiradi va fayl yo'lini qaytaradi.
+    (matn, til, ovoz) uchun kontentga asoslangan kesh kalitini qaytaradi.
     """
-    try:
-        tts = gTTS(text=text, lang=lang, slow=False)
-        # Fayl nomini noyob qilish uchun
-        audio_filename = f"audio_{text.replace(' ', '_')}_{os.urandom(4).hex()}.ogg"
-        audio_path = os.path.join("audio_cache", audio_filename)
+    return hashlib.sha256(f"{lang}\0{voice}\0{text}".encode('utf-8')).hexdigest()
 
-        # audio_cache papkasini yaratish (agar mavjud bo'lmasa)
-        os.makedirs("audio_cache", exist_ok=True)
 
-        # Asinxron ravishda faylni saqlash
-        await tts.save(audio_path)
-        logger.info(f"Audio fayl yaratildi: {audio_path}")
-        return audio_path
-    except Exception as e:
-        logger.error(f"Audio yaratishda xato ({text}): {e}")
+def audio_cache_path(text: str, lang: str = 'en', voice: str = TTS_VOICE) -> str:
+    """
+    Audio faylning keshdagi yo'lini qaytaradi (fayl mavjud bo'lmasligi ham mumkin).
+    """
+    key = audio_cache_key(text, lang, voice)
+    return os.path.join(AUDIO_CACHE_DIR, key[:2], f"{key}.mp3")
+
+
+def _scan_cache() -> list:
+    """
+    Diskdagi mavjud kesh fayllari: oxirgi foydalanish vaqti bo'yicha saralangan (mtime, yo'l, hajm) ro'yxati.
+    Oqimlar pulida ishlaydi.
+    """
+    entries = []
+    for root, _, files in os.walk(AUDIO_CACHE_DIR):
+        for name in files:
+            if not name.endswith('.mp3'):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, path, stat.st_size))
+    return sorted(entries)
+
+
+async def _load_lru():
+    """
+    Diskdagi mavjud kesh fayllarini LRU ro'yxatiga yuklaydi.
+    Katalog oqimlar pulida bir marta o'qiladi, bir vaqtda kelgan so'rovlar shu natijani kutadi.
+    """
+    global _lru_bytes, _lru_loaded, _lru_loading
+    if _lru_loading is None:
+        _lru_loading = asyncio.get_running_loop().run_in_executor(_executor, _scan_cache)
+    entries = await asyncio.shield(_lru_loading)
+    if _lru_loaded:
+        return
+    for _, path, size in entries:
+        _lru[path] = size
+        _lru_bytes += size
+    _lru_loaded = True
+    logger.info(f"Audio kesh yuklandi: {len(_lru)} ta fayl, {_lru_bytes} bayt.")
+
+
+def _file_size(path: str):
+    # Fayl hajmi yoki fayl bo'lmasa None (oqimlar pulida ishlaydi)
+    try:
+        return os.path.getsize(path)
+    except OSError:
         return None
 
-async def delete_audio_file(audio_path: str):
+
+def _utime(path: str):
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+        logger.info(f"Audio kesh to'ldi, eski fayl o'chirildi: {path}")
+    except OSError as e:
+        logger.error(f"Audio keshdan faylni o'chirishda xato ({path}): {e}")
+
+
+def _touch(path: str):
+    """
+    Faylni eng yaqinda ishlatilgan deb belgilaydi.
+    mtime ham yangilanadi (oqimlar pulida, natijasi kutilmaydi), shunda qayta ishga tushganda LRU tartibi saqlanib qoladi.
+    """
+    _lru.move_to_end(path)
+    asyncio.get_running_loop().run_in_executor(_executor, _utime, path)
+
+
+def _remember(path: str, size: int):
+    """
+    Yangi yaratilgan faylni LRU ro'yxatiga qo'shadi va kesh hajmi chegarasini saqlaydi.
+    Eski fayllar oqimlar pulida o'chiriladi, natijasi kutilmaydi.
+    """
+    global _lru_bytes
+    _lru_bytes += size - _lru.pop(path, 0)
+    _lru[path] = size
+    loop = asyncio.get_running_loop()
+    while _eviction_enabled and _lru_bytes > AUDIO_CACHE_MAX_BYTES and len(_lru) > 1:
+        old_path, old_size = _lru.popitem(last=False)
+        _lru_bytes -= old_size
+        loop.run_in_executor(_executor, _remove, old_path)
+
+
+def _forget(path: str):
+    # Diskdan yo'qolgan faylni LRU ro'yxatidan chiqaradi
+    global _lru_bytes
+    _lru_bytes -= _lru.pop(path, 0)
+    logger.info(f"Audio fayl keshda yo'q, qayta yaratiladi: {path}")
+
+
+def _gtts_engine(text: str, lang: str, voice: str, audio_path: str):
+    """
+    Google TTS (gTTS) orqali audioni faylga yozadi.
+    """
+    gTTS(text=text, lang=lang, tld=voice, slow=False).save(audio_path)
+
+
+def _stub_engine(text: str, lang: str, voice: str, audio_path: str):
+    """
+    Tarmoqsiz ishlaydigan soxta dvigatel (testlar va yuklama sinovlari uchun).
+    Haqiqiy audio emas, faqat matnga bog'liq baytlarni yozadi.
+    """
+    with open(audio_path, 'wb') as f:
+        f.write(f"{lang}:{voice}:{text}".encode('utf-8'))
+
+
+# Mavjud TTS dvigatellari: nomi -> funksiya(text, lang, voice, audio_path)
+TTS_ENGINES = {
+    'gtts': _gtts_engine,
+    'stub': _stub_engine,
+}
+_engine = TTS_ENGINES[TTS_ENGINE]
+
+
+def set_tts_engine(name: str):
+    """
+    Ishlatiladigan TTS dvigatelini almashtiradi.
+    """
+    global _engine
+    if name not in TTS_ENGINES:
+        raise ValueError(f"Noma'lum TTS dvigateli: {name}")
+    _engine = TTS_ENGINES[name]
+
+
+def set_tts_workers(max_workers: int):
     """
-    Yaratilgan audio faylni o'chiradi.
+    TTS oqimlar pulining hajmini o'zgartiradi (masalan, oldindan generatsiya qilish vazifasi uchun).
     """
+    global _executor
+    old_executor = _executor
+    _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tts")
+    old_executor.shutdown(wait=False)
+
+
+def set_cache_eviction(enabled: bool):
+    """
+    Kesh hajmi chegarasidan oshganda eski fayllarni o'chirishni yoqadi yoki o'chiradi.
+    """
+    global _eviction_enabled
+    _eviction_enabled = enabled
+
+
+def get_cache_bytes() -> int:
+    """
+    Keshdagi audio fayllarning umumiy hajmi (baytlarda).
+    """
+    return _lru_bytes
+
+
+def is_audio_cached(text: str, lang: str = 'en', voice: str = TTS_VOICE) -> bool:
+    """
+    Matn uchun audio diskdagi keshda borligini tekshiradi.
+    """
+    return os.path.exists(audio_cache_path(text, lang, voice))
+
+
+def _synthesize(text: str, lang: str, voice: str, audio_path: str) -> int:
+    """
+    Tanlangan dvigatel orqali audioni sintez qiladi va fayl hajmini qaytaradi (oqimlar pulida ishlaydi).
+    Avval vaqtinchalik faylga yoziladi, so'ng atomar tarzda o'z joyiga ko'chiriladi.
+    """
+    os.makedirs(os.path.dirname(audio_path), exist_ok=True)
+    tmp_path = f"{audio_path}.{os.urandom(4).hex()}.tmp"
+    try:
+        _engine(text, lang, voice, tmp_path)
+        size = os.path.getsize(tmp_path)
+        os.replace(tmp_path, audio_path)
+        return size
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _record(started_at: float, result: str):
+    metrics.inc('tts_requests_total', result=result)
+    metrics.observe('tts_generate_duration_seconds', time.perf_counter() - started_at, result=result)
+
+
+async def generate_audio(text: str, lang: str = 'en', voice: str = TTS_VOICE):
+    """
+    Berilgan matn uchun audio fayl yo'lini qaytaradi.
+    Audio keshda bo'lsa darhol qaytariladi, aks holda fonda sintez qilinadi.
+    Fayllar diskda saqlanib qoladi, ularni o'chirish shart emas.
+    """
+    started_at = time.perf_counter()
+    if not _lru_loaded:
+        await _load_lru()
+
+    audio_path = audio_cache_path(text, lang, voice)
+    # Keshda bo'lsa ham fayl mavjudligi tekshiriladi: uni boshqa jarayon (o'z LRU ro'yxati bilan) o'chirgan bo'lishi mumkin
+    loop = asyncio.get_running_loop()
+    size = await loop.run_in_executor(_executor, _file_size, audio_path)
+    if size is not None:
+        if audio_path in _lru:
+            _touch(audio_path)
+        else:
+            # Fayl boshqa jarayon tomonidan yaratilgan (masalan, oldindan generatsiya qilish vazifasi)
+            _remember(audio_path, size)
+        _record(started_at, 'hit')
+        return audio_path
+    if audio_path in _lru:
+        _forget(audio_path)
+
+    future = _inflight.get(audio_path)
+    if future is None:
+        future = loop.run_in_executor(_executor, _synthesize, text, lang, voice, audio_path)
+        _inflight[audio_path] = future
+        future.add_done_callback(lambda _: _inflight.pop(audio_path, None))
+
     try:
-        if audio_path and os.path.exists(audio_path):
-            await aiofiles.os.remove(audio_path)
-            logger.info(f"Audio fayl o'chirildi: {audio_path}")
+        # shield: bitta so'rov bekor qilinsa ham, shu so'zni kutayotgan boshqalar uchun sintez davom etadi
+        size = await asyncio.shield(future)
     except Exception as e:
-        logger.error(f"Audio faylni o'chirishda xato ({audio_path}): {e}")
+        logger.error(f"Audio yaratishda xato ({text}): {e}")
+        _record(started_at, 'error')
+        return None
 
+    if audio_path not in _lru:
+        _remember(audio_path, size)
+        logger.info(f"Audio fayl yaratildi: {audio_path}")
+    _record(started_at, 'miss')
+    return audio_path
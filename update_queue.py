@@ -0,0 +1,135 @@
+import asyncio
+from collections import deque
+import logging
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+from config import UPDATE_WORKERS, UPDATE_QUEUE_SIZE, SHUTDOWN_TIMEOUT
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Webhook orqali kelgan update'lar darhol navbatga qo'yiladi va Telegramga 200 qaytariladi,
+# ularni esa fon vazifalari qayta ishlaydi.
+# Har bir chatning o'z navbati (deque) va uni ketma-ket bajaradigan vazifasi bor, shuning uchun bir foydalanuvchining
+# update'lari kelgan tartibida bajariladi, sekin handler esa faqat o'z chatini kutdiradi. Chat vazifasi navbati
+# bo'shaganda tugaydi. Bir vaqtda ishlaydigan handlerlar soni umumiy semafor bilan UPDATE_WORKERS ga cheklangan.
+# Qabul qilingan, lekin tugallanmagan update'lar soni UPDATE_QUEUE_SIZE dan oshmaydi: joy bo'lmasa, update bir oz
+# kutadi; shunda ham joy bo'shamasa webhook 503 qaytaradi va Telegram keyinroq qayta yuboradi.
+ENQUEUE_TIMEOUT = 1.0
+
+_chat_queues = {} # chat -> deque (birinchi element - hozir bajarilayotgan update)
+_chat_tasks = set()
+_handler_slots = None # asyncio.Semaphore(UPDATE_WORKERS)
+_queue_slots = None # asyncio.Semaphore(UPDATE_QUEUE_SIZE)
+_idle = None # tugallanmagan update qolmaganda o'rnatiladi
+_unfinished = 0
+_waiting = 0
+_dispatcher = None
+_bot = None
+
+
+def _chat_key(update: Update) -> int:
+    """
+    Update qaysi chatga (yoki foydalanuvchiga) tegishli ekanini aniqlaydi.
+    """
+    event = update.event
+    chat = getattr(event, 'chat', None) or getattr(getattr(event, 'message', None), 'chat', None)
+    if chat is not None:
+        return chat.id
+    user = getattr(event, 'from_user', None)
+    if user is not None:
+        return user.id
+    return update.update_id
+
+
+async def _run_chat(key: int, queue: deque):
+    """
+    Bitta chatning update'larini navbat bo'shaguncha ketma-ket bajaradi.
+    """
+    global _unfinished, _waiting
+    try:
+        while queue:
+            update = queue[0]
+            async with _handler_slots:
+                _waiting -= 1
+                try:
+                    await _dispatcher.feed_update(_bot, update)
+                except Exception as e:
+                    logger.error(f"Update {update.update_id} ni qayta ishlashda xato: {e}")
+            queue.popleft()
+            _unfinished -= 1
+            _queue_slots.release()
+            if not _unfinished:
+                _idle.set()
+    finally:
+        _chat_queues.pop(key, None)
+
+
+def start_workers(dp: Dispatcher, bot: Bot, workers: int = UPDATE_WORKERS, queue_size: int = UPDATE_QUEUE_SIZE):
+    """
+    Update'larni qayta ishlash uchun cheklovlarni tayyorlaydi.
+    """
+    global _dispatcher, _bot, _handler_slots, _queue_slots, _idle, _unfinished, _waiting
+    _dispatcher, _bot = dp, bot
+    _handler_slots = asyncio.Semaphore(workers)
+    _queue_slots = asyncio.Semaphore(queue_size)
+    _idle = asyncio.Event()
+    _idle.set()
+    _unfinished = _waiting = 0
+    logger.info(f"Update navbati ishga tushdi: bir vaqtda {workers} ta handler, navbatda {queue_size} o'rin.")
+
+
+async def enqueue_update(update: Update) -> bool:
+    """
+    Update'ni o'z chatining navbatiga qo'yadi. Navbat to'lib qolsa False qaytaradi.
+    """
+    global _unfinished, _waiting
+    try:
+        if _queue_slots.locked():
+            await asyncio.wait_for(_queue_slots.acquire(), timeout=ENQUEUE_TIMEOUT)
+        else:
+            await _queue_slots.acquire()
+    except asyncio.TimeoutError:
+        logger.warning(f"Update navbati to'lgan, update {update.update_id} qabul qilinmadi.")
+        return False
+
+    _unfinished += 1
+    _waiting += 1
+    _idle.clear()
+    key = _chat_key(update)
+    queue = _chat_queues.get(key)
+    if queue is not None:
+        queue.append(update)
+        return True
+    queue = _chat_queues[key] = deque([update])
+    task = asyncio.create_task(_run_chat(key, queue))
+    _chat_tasks.add(task)
+    task.add_done_callback(_chat_tasks.discard)
+    return True
+
+
+def queue_depth() -> int:
+    """
+    Navbatlarda kutayotgan (hali boshlanmagan) update'lar soni.
+    """
+    return _waiting
+
+
+async def stop_workers(timeout: float = SHUTDOWN_TIMEOUT):
+    """
+    Navbatdagi update'larni qayta ishlab bo'lishini kutadi (ko'pi bilan timeout soniya) va chat vazifalarini to'xtatadi.
+    """
+    if _idle is None:
+        return
+    try:
+        await asyncio.wait_for(_idle.wait(), timeout=timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"Navbatda {_unfinished} ta update qayta ishlanmay qoldi.")
+    tasks = list(_chat_tasks)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    _chat_tasks.clear()
+    _chat_queues.clear()
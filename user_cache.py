@@ -0,0 +1,62 @@
+from collections import OrderedDict
+import time
+
+from config import USER_CACHE_TTL
+
+# Foydalanuvchi qatorlari uchun qisqa muddatli jarayon ichidagi kesh.
+# telegram_id -> (amal qilish muddati, foydalanuvchi ma'lumotlari lug'ati), LRU tartibida
+_users = OrderedDict()
+# Keshlanadigan foydalanuvchilar soni (oshsa eng uzoq ishlatilmaganlari o'chiriladi)
+LOCAL_CACHE_SIZE = 10_000
+# users.id -> telegram_id (ID bo'yicha yangilanadigan funksiyalar uchun)
+_telegram_ids = {}
+
+
+def get_user(telegram_id: int):
+    """
+    Keshdagi foydalanuvchini qaytaradi (muddati o'tgan bo'lsa None).
+    """
+    entry = _users.get(telegram_id)
+    if entry is None:
+        return None
+    expires_at, user = entry
+    if expires_at < time.monotonic():
+        forget_user(telegram_id)
+        return None
+    _users.move_to_end(telegram_id)
+    return user
+
+
+def put_user(user) -> dict:
+    """
+    Foydalanuvchi qatorini keshga yozadi va uning nusxasini (lug'at) qaytaradi.
+    """
+    user = dict(user)
+    if USER_CACHE_TTL <= 0:
+        return user
+    _users[user['telegram_id']] = (time.monotonic() + USER_CACHE_TTL, user)
+    _users.move_to_end(user['telegram_id'])
+    _telegram_ids[user['id']] = user['telegram_id']
+    while len(_users) > LOCAL_CACHE_SIZE:
+        _, (_, old_user) = _users.popitem(last=False)
+        _telegram_ids.pop(old_user['id'], None)
+    return user
+
+
+def update_user(user_id: int, **fields):
+    """
+    Bazada o'zgargan maydonlarni keshdagi foydalanuvchiga ham yozadi (write-through).
+    """
+    telegram_id = _telegram_ids.get(user_id)
+    entry = _users.get(telegram_id) if telegram_id is not None else None
+    if entry is not None:
+        entry[1].update(fields)
+
+
+def forget_user(telegram_id: int):
+    """
+    Foydalanuvchini keshdan o'chiradi.
+    """
+    entry = _users.pop(telegram_id, None)
+    if entry is not None:
+        _telegram_ids.pop(entry[1]['id'], None)
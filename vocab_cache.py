@@ -0,0 +1,170 @@
+from array import array
+import asyncio
+import logging
+import random
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Lug'at keshi: 'words' jadvali bir marta xotiraga yuklanadi.
+# So'zlar parallel massivlarda saqlanadi: i-indeksdagi so'zning ID'si word_ids[i],
+# inglizchasi english_words[i], o'zbekchasi uzbek_words[i], talaffuzining Telegram file_id'si audio_file_ids[i].
+word_ids = array('l')
+english_words = []
+uzbek_words = []
+audio_file_ids = []
+# word_id -> massivdagi indeks
+_index_by_id = {}
+is_loaded = False
+
+# Redis'dagi lug'at versiyasi: import vositasi lug'atni o'zgartirganda uni oshiradi,
+# bot jarayonlari esa versiya o'zgarganini ko'rib, keshni qayta yuklaydi.
+VOCAB_VERSION_KEY = "vocab:version"
+# Versiyani tekshirish oralig'i (soniya)
+REFRESH_CHECK_INTERVAL = 60
+
+
+async def load_vocabulary(conn):
+    """
+    'words' jadvalini to'liq o'qib, keshni qaytadan quradi.
+    """
+    global word_ids, english_words, uzbek_words, audio_file_ids, _index_by_id, is_loaded
+    rows = await conn.fetch("SELECT id, english_word, uzbek_word, audio_url FROM words ORDER BY id;")
+
+    new_ids = array('l')
+    new_english = []
+    new_uzbek = []
+    new_audio = []
+    new_index = {}
+    for i, row in enumerate(rows):
+        new_ids.append(row['id'])
+        new_english.append(row['english_word'])
+        new_uzbek.append(row['uzbek_word'])
+        new_audio.append(row['audio_url'])
+        new_index[row['id']] = i
+
+    # Barcha massivlar birdaniga almashtiriladi, shunda o'qiyotganlar yarim tayyor keshni ko'rmaydi
+    word_ids, english_words, uzbek_words, audio_file_ids, _index_by_id = new_ids, new_english, new_uzbek, new_audio, new_index
+    is_loaded = True
+    logger.info(f"Lug'at keshi yuklandi: {len(word_ids)} ta so'z.")
+
+
+def add_to_vocabulary(word_id: int, english_word: str, uzbek_word: str, audio_file_id: str = None):
+    """
+    Bazaga yangi qo'shilgan so'zni keshga qo'shadi (yoki mavjudini yangilaydi).
+    """
+    i = _index_by_id.get(word_id)
+    if i is not None:
+        english_words[i] = english_word
+        uzbek_words[i] = uzbek_word
+        audio_file_ids[i] = audio_file_id
+        return
+    _index_by_id[word_id] = len(word_ids)
+    word_ids.append(word_id)
+    english_words.append(english_word)
+    uzbek_words.append(uzbek_word)
+    audio_file_ids.append(audio_file_id)
+
+
+def vocabulary_size() -> int:
+    """
+    Keshdagi so'zlar sonini qaytaradi.
+    """
+    return len(word_ids)
+
+
+def get_word(word_id: int):
+    """
+    So'zni ID bo'yicha qaytaradi: (english_word, uzbek_word) yoki None.
+    """
+    i = _index_by_id.get(word_id)
+    if i is None:
+        return None
+    return english_words[i], uzbek_words[i]
+
+
+def get_audio_file_id(word_id: int):
+    """
+    So'z talaffuzining Telegram file_id'sini qaytaradi (agar ma'lum bo'lsa).
+    """
+    i = _index_by_id.get(word_id)
+    return audio_file_ids[i] if i is not None else None
+
+
+def set_audio_file_id(word_id: int, audio_file_id: str = None):
+    """
+    So'z talaffuzining Telegram file_id'sini keshda yangilaydi (None - o'chirish).
+    """
+    i = _index_by_id.get(word_id)
+    if i is not None:
+        audio_file_ids[i] = audio_file_id
+
+
+def sample_word_ids(count: int, exclude_ids: set = frozenset()) -> list[int]:
+    """
+    Lug'atdan bir xil ehtimollik bilan, takrorlanmasdan count ta so'z ID'sini tanlaydi.
+    exclude_ids dagi so'zlar tanlanmaydi. Lug'at hajmidan qat'i nazar O(count) vaqtda ishlaydi.
+    """
+    size = len(word_ids)
+    available = size - len(exclude_ids)
+    count = min(count, available)
+    if count <= 0:
+        return []
+    if count * 2 > available:
+        return random.sample([word_id for word_id in word_ids if word_id not in exclude_ids], count)
+
+    chosen = set()
+    result = []
+    while len(result) < count:
+        word_id = word_ids[random.randrange(size)]
+        if word_id in exclude_ids or word_id in chosen:
+            continue
+        chosen.add(word_id)
+        result.append(word_id)
+    return result
+
+
+def sample_option_words(exclude_word_id: int, count: int) -> list[dict]:
+    """
+    Test variantlari uchun tasodifiy so'zlarni keshdan tanlaydi, berilgan so'zni istisno qilgan holda.
+    Lug'at hajmidan qat'i nazar O(count) vaqtda ishlaydi.
+    """
+    size = len(word_ids)
+    exclude_index = _index_by_id.get(exclude_word_id)
+    available = size - (1 if exclude_index is not None else 0)
+    count = min(count, available)
+    if count <= 0:
+        return []
+
+    if count * 2 > available:
+        # Kichik lug'atda rad etish ko'payib ketmasligi uchun oddiy tanlovdan foydalanamiz
+        indexes = random.sample([i for i in range(size) if i != exclude_index], count)
+        return [{'id': word_ids[i], 'english_word': english_words[i], 'uzbek_word': uzbek_words[i]} for i in indexes]
+
+    chosen = set()
+    result = []
+    # Lug'at variantlar sonidan ancha katta bo'lgani uchun tasodifiy indeks tanlash deyarli doim birinchi urinishda muvaffaqiyatli bo'ladi
+    while len(result) < count:
+        i = random.randrange(size)
+        if i == exclude_index or i in chosen:
+            continue
+        chosen.add(i)
+        result.append({'id': word_ids[i], 'english_word': english_words[i], 'uzbek_word': uzbek_words[i]})
+    return result
+
+
+async def run_refresh_worker(redis, reload):
+    """
+    Lug'at versiyasini vaqti-vaqti bilan tekshirib, o'zgargan bo'lsa keshni qayta yuklaydigan fon vazifasi.
+    reload - keshni bazadan qayta yuklaydigan korutina funksiyasi.
+    """
+    known_version = await redis.get(VOCAB_VERSION_KEY)
+    while True:
+        await asyncio.sleep(REFRESH_CHECK_INTERVAL)
+        try:
+            version = await redis.get(VOCAB_VERSION_KEY)
+            if version != known_version:
+                await reload()
+                known_version = version
+        except Exception as e:
+            logger.error(f"Lug'at keshini yangilashda xato: {e}")